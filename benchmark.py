@@ -0,0 +1,620 @@
+""" Implementing of a benchmark harness driving the tournament service against local stand-ins. """
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from game_api_client import GameAPIClient, OsuAPIClient
+from sheets_manager import (
+    OsuTournamentSheetsManager, SheetsRequestScheduler, SQLiteTournamentSheetsManager, a1_to_rowcol
+)
+from storage import dump_tournament, load_tournament
+from tournament import OsuMatchManager, OsuTournamentManager, SEBracketManager, TournamentService
+
+DEFAULT_SIZES = [16, 64, 256, 1024, 4096]
+
+SIGNUPS_SHEET_ID = 1
+TEAMS_SHEET_ID = 2
+BRACKET_SHEET_ID = 3
+
+# The bot modules imported on startup, main itself runs the bot and discord.py is imported anyway.
+STARTUP_MODULES = (
+    "bracket_renderer", "dispatcher", "events", "game_api_client", "metrics",
+    "registry", "sheets_manager", "storage", "tournament", "user_cache"
+)
+# Heavy dependencies which should be imported only when they are used.
+LAZY_MODULES = ("gspread", "oauth2client", "PIL")
+
+GUEST_AVATAR_URL = "https://osu.ppy.sh/images/layout/avatar-guest.png"
+
+class QuotaCounter:
+    """
+    Represents a counter of requests against a per-minute quota.
+    Requests beyond the quota in any sixty seconds window are counted
+    as the ones the real service would reject.
+    """
+
+    def __init__(self, requests_per_minute: int):
+        self._requests_per_minute = requests_per_minute
+        self._window: deque[float] = deque()
+        self.requests = Counter()
+        self.over_quota = 0
+
+    def count(self, operation: str):
+        """Counts a request of the operation. """
+
+        now = time.monotonic()
+        while self._window and now - self._window[0] >= 60:
+            self._window.popleft()
+
+        self._window.append(now)
+        self.requests[operation] += 1
+        if len(self._window) > self._requests_per_minute:
+            self.over_quota += 1
+
+    def snapshot(self) -> dict:
+        """Returns the counts made so far. """
+        return {"requests": dict(self.requests), "over_quota": self.over_quota}
+
+class FakeGameAPIClient(GameAPIClient):
+    """
+    Represents a game api client answering from generated data.
+
+    Every poll of a linked match reveals one more game of it,
+    the winner of every game is random but reproducible.
+    """
+
+    def __init__(self, latency: float = 0.0, requests_per_minute: int = 60, seed: int = 0):
+        self._latency = latency
+        self._random = random.Random(seed)
+        self._matches: dict[int, dict] = {}
+        self.quota = QuotaCounter(requests_per_minute)
+
+    def link_match(self, match_id: int, team1_ids: list[int], team2_ids: list[int], games: int):
+        """Registers the players of the match to be played. """
+        self._matches[match_id] = {
+            "sides": (team1_ids, team2_ids),
+            "winners": [self._random.randint(0, 1) for _ in range(games)],
+            "revealed": 0,
+        }
+
+    def forget_matches(self):
+        """Drops the registered matches, e.g. so they are not measured with the tournament. """
+        self._matches.clear()
+
+    async def get_user_info(self, user_id: int) -> dict:
+        self.quota.count("get_user_info")
+        if self._latency:
+            await asyncio.sleep(self._latency)
+
+        return self._get_user_data(user_id)
+
+    async def get_users_info(self, user_ids: list[int]) -> dict[int, dict]:
+        users_data = {}
+        for i in range(0, len(user_ids), OsuAPIClient.USERS_LIMIT):
+            self.quota.count("get_users_info")
+            if self._latency:
+                await asyncio.sleep(self._latency)
+
+            for user_id in user_ids[i:i + OsuAPIClient.USERS_LIMIT]:
+                users_data[user_id] = self._get_user_data(user_id)
+        return users_data
+
+    @staticmethod
+    def _get_user_data(user_id: int) -> dict:
+        avatar_url = f"https://a.ppy.sh/{user_id}?{1700000000 + user_id}.jpeg"
+        if user_id % 8 == 0:
+            avatar_url = GUEST_AVATAR_URL
+
+        return {
+            "id": user_id,
+            "username": f"player{user_id}",
+            "avatar_url": avatar_url,
+            "country_code": ("RU", "US", "DE", "JP", "KR")[user_id % 5],
+        }
+
+    async def get_match_info(self, match_id: int, after: int|None = None) -> dict:
+        self.quota.count("get_match_info")
+        if self._latency:
+            await asyncio.sleep(self._latency)
+
+        match = self._matches[match_id]
+        match["revealed"] = min(match["revealed"] + 1, len(match["winners"]))
+
+        events = []
+        for game_number, winner in enumerate(match["winners"][:match["revealed"]]):
+            event_id = game_number + 1
+            if after is not None and event_id <= after:
+                continue
+
+            scores = [
+                {"user_id": user_id, "score": 1_000_000 if side == winner else 500_000}
+                for side, user_ids in enumerate(match["sides"])
+                for user_id in user_ids
+            ]
+            events.append({"id": event_id, "game": {"scores": scores}})
+
+        return {"match": {"id": match_id}, "events": events, "latest_event_id": match["revealed"]}
+
+class FakeWorksheet:
+    """Represents an in-memory worksheet implementing the gspread calls used by the sheets manager. """
+
+    def __init__(
+        self,
+        reads: QuotaCounter,
+        writes: QuotaCounter,
+        latency: float = 0.0,
+        rows: int|None = 1000,
+        cols: int = 26
+    ):
+        self._reads = reads
+        self._writes = writes
+        self._latency = latency
+        self._rows = rows
+        self.col_count = cols
+        self.cells: dict[tuple[int, int], str] = {}
+
+    @property
+    def row_count(self) -> int:
+        """Rows of the grid, without a fixed size it grows with the filled rows like a form responses sheet. """
+        if self._rows is not None:
+            return self._rows
+        return max((row for row, _ in self.cells), default=1)
+
+    def get(self, range_name: str, **_) -> list[list[str]]:
+        """
+        Returns the values of the range, open ended ranges stop at the last filled row.
+        Ranges outside of the grid are rejected like google sheets does.
+        """
+
+        self._reads.count("get")
+        if self._latency:
+            time.sleep(self._latency)
+
+        top, left, bottom, right = self._parse_range(range_name)
+        if top > self.row_count or right > self.col_count:
+            raise ValueError(f"range {range_name} exceeds grid limits")
+        if bottom is None:
+            bottom = max((row for row, _ in self.cells), default=top - 1)
+
+        grid = []
+        for row in range(top, bottom + 1):
+            values = [self.cells.get((row, col), "") for col in range(left, right + 1)]
+            while values and values[-1] == "":
+                values.pop()
+            grid.append(values)
+
+        while grid and not grid[-1]:
+            grid.pop()
+        return grid
+
+    def batch_update(self, data: list[dict], **_):
+        """Writes the values of every range starting from its top-left cell. """
+
+        self._writes.count("batch_update")
+        if self._latency:
+            time.sleep(self._latency)
+
+        for update in data:
+            top, left, _, _ = self._parse_range(update["range"])
+            for row, values in enumerate(update["values"], top):
+                for col, value in enumerate(values, left):
+                    self.cells[(row, col)] = str(value)
+
+    @staticmethod
+    def _parse_range(range_name: str) -> tuple[int, int, int|None, int]:
+        """Returns (top, left, bottom, right) of A1 notation, bottom is None for open ended ranges. """
+
+        start, _, end = range_name.partition(":")
+        top, left = a1_to_rowcol(start)
+        if not end:
+            return top, left, top, left
+
+        if re.fullmatch(r"[A-Za-z]+", end):
+            return top, left, None, a1_to_rowcol(f"{end}1")[1]
+
+        bottom, right = a1_to_rowcol(end)
+        return top, left, bottom, right
+
+class FakeSpreadsheet:
+    """Represents an in-memory spreadsheet with the signups, teams and bracket worksheets. """
+
+    def __init__(self, latency: float = 0.0, requests_per_minute: int = 60):
+        self.reads = QuotaCounter(requests_per_minute)
+        self.writes = QuotaCounter(requests_per_minute)
+        self.worksheets = {
+            SIGNUPS_SHEET_ID: FakeWorksheet(self.reads, self.writes, latency, rows=None),
+            TEAMS_SHEET_ID: FakeWorksheet(self.reads, self.writes, latency),
+            BRACKET_SHEET_ID: FakeWorksheet(self.reads, self.writes, latency, rows=5000, cols=200),
+        }
+
+    def open_by_key(self, _key: str) -> "FakeSpreadsheet":
+        """Stands for both the gspread client and the opened spreadsheet. """
+        return self
+
+    def get_worksheet_by_id(self, sheet_id: int) -> FakeWorksheet:
+        """Returns the worksheet by its id, fetching the spreadsheet metadata counts as a read. """
+        self.reads.count("get_worksheet")
+        return self.worksheets[sheet_id]
+
+    def snapshot(self) -> dict:
+        """Returns the read and write counts made so far. """
+        return {"reads": self.reads.snapshot(), "writes": self.writes.snapshot()}
+
+class BenchmarkSheetsManager(OsuTournamentSheetsManager):
+    """Represents a sheets manager working with an in-memory spreadsheet instead of google sheets. """
+
+    def __init__(self, spreadsheet: FakeSpreadsheet, request_scheduler: SheetsRequestScheduler):
+        super().__init__(
+            "benchmark", SIGNUPS_SHEET_ID, TEAMS_SHEET_ID, BRACKET_SHEET_ID,
+            request_scheduler=request_scheduler
+        )
+        self._fake_spreadsheet = spreadsheet
+
+    def _gspread_authorize(self, key_path: str) -> FakeSpreadsheet:
+        return self._fake_spreadsheet
+
+def fill_signups(spreadsheet: FakeSpreadsheet, teams_amount: int, team_length: int = 1):
+    """Fills the signups worksheet with a header and a signup per team. """
+
+    cells = spreadsheet.worksheets[SIGNUPS_SHEET_ID].cells
+    cells[(1, 1)] = "Timestamp"
+
+    for team_number in range(teams_amount):
+        row = team_number + 2
+        cells[(row, 1)] = f"2024-01-01 00:{team_number // 60 % 60:02}:{team_number % 60:02}"
+        for member in range(team_length):
+            user_id = 1000 + team_number * team_length + member
+            cells[(row, 2 + member * 2)] = str(user_id)
+            cells[(row, 3 + member * 2)] = f"discord{user_id}"
+
+class OperationRecorder:
+    """Represents a recorder of wall time and requests made by every benchmarked operation. """
+
+    def __init__(self, api_client: FakeGameAPIClient, spreadsheet: FakeSpreadsheet):
+        self._api_client = api_client
+        self._spreadsheet = spreadsheet
+        self.operations: dict[str, dict] = {}
+
+    async def record(self, name: str, operation):
+        """Runs the operation (a coroutine or a callable) and adds its costs to the named entry. """
+
+        api_before = self._api_client.quota.snapshot()
+        sheets_before = self._spreadsheet.snapshot()
+
+        start = time.perf_counter()
+        result = operation() if callable(operation) else operation
+        if asyncio.iscoroutine(result):
+            result = await result
+        elapsed = time.perf_counter() - start
+
+        entry = self.operations.setdefault(
+            name,
+            {"runs": 0, "seconds": 0.0, "api_calls": {}, "api_over_quota": 0,
+             "sheets_reads": 0, "sheets_writes": 0, "sheets_over_quota": 0}
+        )
+        api_after = self._api_client.quota.snapshot()
+        sheets_after = self._spreadsheet.snapshot()
+
+        entry["runs"] += 1
+        entry["seconds"] += elapsed
+        for call, count in api_after["requests"].items():
+            made = count - api_before["requests"].get(call, 0)
+            if made:
+                entry["api_calls"][call] = entry["api_calls"].get(call, 0) + made
+        entry["api_over_quota"] += api_after["over_quota"] - api_before["over_quota"]
+
+        for kind in ("reads", "writes"):
+            entry[f"sheets_{kind}"] += (
+                sum(sheets_after[kind]["requests"].values())
+                - sum(sheets_before[kind]["requests"].values())
+            )
+            entry["sheets_over_quota"] += (
+                sheets_after[kind]["over_quota"] - sheets_before[kind]["over_quota"]
+            )
+        return result
+
+async def benchmark_tournament(
+    teams_amount: int,
+    api_latency: float = 0.0,
+    sheets_latency: float = 0.0,
+    api_quota: int = 60,
+    sheets_quota: int = 60,
+    seed: int = 0,
+    local_sheets: bool = False
+) -> dict[str, dict]:
+    """
+    Runs a synthetic single elimination tournament of teams_amount teams
+    from the signups to the final and returns the costs of every operation.
+    With local_sheets the sheets are kept in an in-memory SQLite database.
+    """
+
+    api_client = FakeGameAPIClient(api_latency, api_quota, seed)
+    spreadsheet = FakeSpreadsheet(sheets_latency, sheets_quota)
+    fill_signups(spreadsheet, teams_amount)
+
+    recorder = OperationRecorder(api_client, spreadsheet)
+    tournament_manager = OsuTournamentManager(api_client)
+
+    if local_sheets:
+        sheets_manager = SQLiteTournamentSheetsManager(":memory:", f"benchmark-{teams_amount}-{seed}")
+        cells = spreadsheet.worksheets[SIGNUPS_SHEET_ID].cells
+        sheets_manager.add_signups(
+            [cells[(row, 1)], cells[(row, 2)], cells[(row, 3)]] for row in range(2, teams_amount + 2)
+        )
+    else:
+        # Google counts the quotas per minute, so a whole minute of requests can be sent at once.
+        request_scheduler = SheetsRequestScheduler(sheets_quota, sheets_quota, burst=sheets_quota)
+        sheets_manager = BenchmarkSheetsManager(spreadsheet, request_scheduler)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        service = TournamentService(sheets_manager, tournament_manager, executor)
+        service.create_tournament()
+
+        await recorder.record("update_teams", service.update_teams())
+        await recorder.record("update_teams (no new signups)", service.update_teams())
+        await recorder.record(
+            "generate_bracket", lambda: service.generate_bracket(SEBracketManager(OsuMatchManager()))
+        )
+        await recorder.record("update_bracket_sheet", service.update_bracket_sheet())
+
+        next_match_id = 1
+        while True:
+            playable = [
+                match for match in service.get_matches()
+                if match.status == "Pending" and match.team1 is not None and match.team2 is not None
+            ]
+            if not playable:
+                break
+
+            def link_matches():
+                nonlocal next_match_id
+                for match in playable:
+                    api_client.link_match(
+                        next_match_id,
+                        [member.user_id for member in match.team1.members],
+                        [member.user_id for member in match.team2.members],
+                        match.games_amount
+                    )
+                    service.connect_match_id(next_match_id, match.team1.members[0].discord_id)
+                    next_match_id += 1
+
+            await recorder.record("connect_match_id", link_matches)
+
+            while any(match.status == "In Progress" for match in playable):
+                await recorder.record("update_bracket", service.update_bracket())
+
+        await recorder.record("update_bracket_sheet (no changes)", service.update_bracket_sheet())
+
+    return recorder.operations
+
+async def play_round(api_client: FakeGameAPIClient, tournament_manager: OsuTournamentManager) -> int:
+    """Links and plays all the matches that are ready, returns the amount of played matches. """
+
+    playable = [
+        match for match in tournament_manager.get_matches()
+        if match.status == "Pending" and match.team1 is not None and match.team2 is not None
+    ]
+    for match_id, match in enumerate(playable, 1):
+        api_client.link_match(
+            match_id,
+            [member.user_id for member in match.team1.members],
+            [member.user_id for member in match.team2.members],
+            match.games_amount
+        )
+        tournament_manager.connect_match_id(match_id, match.team1.members[0].discord_id)
+
+    while any(match.status == "In Progress" for match in playable):
+        await tournament_manager.update_bracket()
+    return len(playable)
+
+async def benchmark_memory(teams_amount: int, seed: int = 0) -> dict[str, int]:
+    """
+    Measures with tracemalloc the memory held by a tournament of teams_amount teams
+    with its first round played, registered from the signups and restored from a snapshot,
+    and the memory allocated by a bracket sheet sync and a snapshot.
+    """
+
+    api_client = FakeGameAPIClient(seed=seed)
+    signups = [
+        ["2024-01-01", str(1000 + team_number), f"discord{1000 + team_number}"]
+        for team_number in range(teams_amount)
+    ]
+    memory = {}
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tournament_manager = OsuTournamentManager(api_client)
+        tournament_manager.create_tournament(1)
+        await tournament_manager.update_teams(signups)
+        tournament_manager.generate_bracket(SEBracketManager(OsuMatchManager()))
+        await play_round(api_client, tournament_manager)
+        api_client.forget_matches()
+        memory["tournament_bytes"] = tracemalloc.get_traced_memory()[0] - before
+
+        # The first sync builds what later syncs reuse, the steady state is measured.
+        service = TournamentService(None, tournament_manager)
+        # pylint: disable-next=protected-access
+        service._convert_matches_for_updating()
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        # pylint: disable-next=protected-access
+        matches_info = service._convert_matches_for_updating()
+        memory["sync_peak_bytes"] = tracemalloc.get_traced_memory()[1] - before
+        del matches_info
+
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        state = json.dumps(dump_tournament(tournament_manager))
+        memory["snapshot_peak_bytes"] = tracemalloc.get_traced_memory()[1] - before
+
+        before = tracemalloc.get_traced_memory()[0]
+        restored_manager = OsuTournamentManager(api_client)
+        load_tournament(json.loads(state), restored_manager, OsuMatchManager())
+        memory["restored_bytes"] = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+    return memory
+
+def benchmark_startup(runs: int = 5) -> dict:
+    """
+    Measures the cold import of the bot modules in fresh interpreters
+    and returns the best and median seconds and the heavy dependencies imported eagerly.
+    """
+
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {', '.join(STARTUP_MODULES)}\n"
+        "print(time.perf_counter() - start)\n"
+        f"print(' '.join(name for name in {LAZY_MODULES!r} if name in sys.modules))\n"
+    )
+
+    seconds = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", code],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.splitlines()
+        seconds.append(float(output[0]))
+
+    return {
+        "best_seconds": min(seconds),
+        "median_seconds": statistics.median(seconds),
+        "eager_modules": output[1].split() if len(output) > 1 else [],
+    }
+
+def get_version() -> str:
+    """Returns the current git commit or "unknown" outside of a repository. """
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def print_results(results: dict, previous: dict|None = None):
+    """Prints the results by tournament size, compared with the previous ones if given. """
+
+    startup = results.get("startup")
+    if startup is not None:
+        print("\nstartup imports")
+        previous_startup = (previous or {}).get("startup", {})
+        for name in ("best_seconds", "median_seconds"):
+            line = f"{name:<36}{startup[name]:>12.3f}"
+            if previous_startup.get(name):
+                line += f"  x{startup[name] / previous_startup[name]:.2f}"
+            print(line)
+        print(f"{'eager heavy modules':<36}{', '.join(startup['eager_modules']) or 'none':>12}")
+
+    for size, memory in results.get("memory", {}).items():
+        print(f"\n{size} teams, memory")
+        previous_memory = (previous or {}).get("memory", {}).get(size, {})
+        for name, value in memory.items():
+            line = f"{name:<36}{value / 1024:>12.1f} KiB"
+            if previous_memory.get(name):
+                line += f"  x{value / previous_memory[name]:.2f}"
+            print(line)
+
+    for size, operations in results["results"].items():
+        print(f"\n{size} teams")
+        print(f"{'operation':<36}{'runs':>6}{'seconds':>11}{'api':>7}{'reads':>7}{'writes':>8}{'over quota':>12}")
+
+        previous_operations = (previous or {}).get("results", {}).get(size, {})
+        for name, entry in operations.items():
+            line = (
+                f"{name:<36}{entry['runs']:>6}{entry['seconds']:>11.4f}"
+                f"{sum(entry['api_calls'].values()):>7}{entry['sheets_reads']:>7}"
+                f"{entry['sheets_writes']:>8}{entry['api_over_quota'] + entry['sheets_over_quota']:>12}"
+            )
+
+            previous_entry = previous_operations.get(name)
+            if previous_entry is not None and previous_entry["seconds"] > 0:
+                line += f"  x{entry['seconds'] / previous_entry['seconds']:.2f} time"
+                requests = sum(entry["api_calls"].values()) + entry["sheets_reads"] + entry["sheets_writes"]
+                previous_requests = (
+                    sum(previous_entry["api_calls"].values())
+                    + previous_entry["sheets_reads"] + previous_entry["sheets_writes"]
+                )
+                line += f", {requests - previous_requests:+} requests"
+            print(line)
+
+async def run(args: argparse.Namespace) -> dict:
+    """Runs the benchmark of every size. """
+
+    results = {
+        "version": get_version(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "api_latency": args.api_latency,
+            "sheets_latency": args.sheets_latency,
+            "api_quota": args.api_quota,
+            "sheets_quota": args.sheets_quota,
+            "seed": args.seed,
+            "local_sheets": args.local_sheets,
+        },
+        "results": {},
+    }
+
+    if args.startup:
+        results["startup"] = benchmark_startup()
+        return results
+
+    if args.memory:
+        results["memory"] = {}
+        for size in args.sizes:
+            results["memory"][str(size)] = await benchmark_memory(size, args.seed)
+        return results
+
+    for size in args.sizes:
+        results["results"][str(size)] = await benchmark_tournament(
+            size, args.api_latency, args.sheets_latency, args.api_quota, args.sheets_quota, args.seed,
+            args.local_sheets
+        )
+    return results
+
+def main():
+    """Parses the arguments, runs the benchmark and saves the results. """
+
+    parser = argparse.ArgumentParser(description="Benchmark the tournament service against local stand-ins.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="amounts of teams")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="seconds per osu! api request")
+    parser.add_argument("--sheets-latency", type=float, default=0.0, help="seconds per sheets request")
+    parser.add_argument("--api-quota", type=int, default=60, help="osu! api requests per minute")
+    parser.add_argument("--sheets-quota", type=int, default=60, help="sheets reads and writes per minute each")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generated match results")
+    parser.add_argument("--memory", action="store_true", help="measure memory instead of time and requests")
+    parser.add_argument("--local-sheets", action="store_true", help="keep the sheets in local SQLite")
+    parser.add_argument("--startup", action="store_true", help="measure the import time of the bot modules")
+    parser.add_argument("--output", default="benchmark_results.json", help="file to save the results to")
+    parser.add_argument("--compare", help="previously saved results to compare with")
+    args = parser.parse_args()
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            previous = json.load(file)
+
+    results = asyncio.run(run(args))
+    print_results(results, previous)
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+    print(f"\nResults are saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
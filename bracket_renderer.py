@@ -0,0 +1,528 @@
+""" Implementing of rendering of the tournament bracket to PNG images. """
+
+import asyncio
+import hashlib
+import importlib.util
+import io
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from typing import Iterable
+
+import aiohttp
+
+from events import MatchCompleted, MatchLinked, ScoreChanged, TeamAdvanced
+from tournament import Match, Team, TournamentManager
+
+logger = logging.getLogger(__name__)
+
+# Pillow is needed only to render the bracket images, it is imported on the first rendering.
+RENDERING_AVAILABLE = importlib.util.find_spec("PIL") is not None
+
+AVATAR_SIZE = 28
+HEADER_HEIGHT = 16
+ROW_HEIGHT = 32
+TILE_WIDTH = 220
+TILE_HEIGHT = HEADER_HEIGHT + ROW_HEIGHT * 2
+COLUMN_GAP = 40
+ROW_GAP = 12
+MARGIN = 16
+
+BACKGROUND_COLOR = (30, 31, 34)
+TILE_COLOR = (49, 51, 56)
+LINE_COLOR = (88, 91, 99)
+TEXT_COLOR = (219, 222, 225)
+MUTED_COLOR = (148, 155, 164)
+WINNER_COLOR = (87, 242, 135)
+AVATAR_PLACEHOLDER_COLOR = (78, 80, 88)
+
+_font = None
+
+def get_font():
+    """Returns the font of the bracket images, loaded once. """
+    global _font
+    if _font is None:
+        from PIL import ImageFont  # pylint: disable=import-outside-toplevel
+
+        try:
+            _font = ImageFont.load_default(size=13)
+        except TypeError:
+            # Older Pillow has only the bitmap font.
+            _font = ImageFont.load_default()
+    return _font
+
+@dataclass(frozen=True, slots=True)
+class TileData:
+    """Represents what is drawn on the tile of a match, (name, avatar url) of its teams. """
+
+    number: int
+    status: str
+    score: str
+    team1: tuple[str, str|None]|None
+    team2: tuple[str, str|None]|None
+    winner: int
+
+@dataclass(eq=False)
+class BracketView:
+    """Represents a part of the bracket drawn on a canvas, the tiles are pasted at their positions. """
+
+    numbers: list[int]
+    positions: dict[int, tuple[int, int]]
+    lines: list[list[tuple[int, int]]]
+    size: tuple[int, int]
+
+    canvas: object = field(default=None, repr=False)
+    # Revisions of the tiles pasted on the canvas.
+    pasted: dict[int, int] = field(default_factory=dict, repr=False)
+    png: bytes|None = field(default=None, repr=False)
+    revision: int = -1
+
+class AvatarCache:
+    """
+    Represents a cache of the avatars resized for the bracket images.
+    Every avatar is downloaded once and kept as a PNG file in the directory,
+    the recently used ones are also kept decoded in memory.
+    Avatars which failed to download are retried after retry_after seconds.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_memory: int = 1024,
+        max_concurrency: int = 8,
+        retry_after: float = 3600.0
+    ):
+        self._directory = directory
+        self._max_memory = max_memory
+        self._retry_after = retry_after
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._images: OrderedDict[str, object] = OrderedDict()
+        self._stored: set[str] = set()
+        self._failed: dict[str, float] = {}
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._downloads: dict[str, asyncio.Task] = {}
+        self._session: aiohttp.ClientSession|None = None
+
+    async def prefetch(self, urls: Iterable[str], executor: Executor|None = None):
+        """Downloads the avatars which aren't stored yet, concurrently and once per url. """
+
+        now = time.monotonic()
+        tasks = []
+        for url in set(urls):
+            if url in self._downloads:
+                tasks.append(self._downloads[url])
+                continue
+            if url in self._stored or now - self._failed.get(url, -self._retry_after) < self._retry_after:
+                continue
+            if os.path.exists(self._get_path(url)):
+                self._stored.add(url)
+                continue
+
+            task = asyncio.create_task(self._download(url, executor))
+            self._downloads[url] = task
+            task.add_done_callback(lambda _, url=url: self._downloads.pop(url, None))
+            tasks.append(task)
+
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    def get(self, url: str):
+        """Returns the resized avatar or None if it isn't stored. """
+
+        with self._lock:
+            image = self._images.get(url)
+            if image is not None:
+                self._images.move_to_end(url)
+                return image
+
+        path = self._get_path(url)
+        if not os.path.exists(path):
+            return None
+
+        from PIL import Image  # pylint: disable=import-outside-toplevel
+        with Image.open(path) as file:
+            image = file.convert("RGB")
+        self._remember(url, image)
+        return image
+
+    async def close(self):
+        """Closes the underlying HTTP session. """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def _download(self, url: str, executor: Executor|None):
+        try:
+            async with self._semaphore:
+                async with self._get_session().get(url) as response:
+                    response.raise_for_status()
+                    data = await response.read()
+
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(executor, self._store, url, data)
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            logger.warning("Failed to download the avatar %s: %s", url, e)
+            self._failed[url] = time.monotonic()
+
+    def _store(self, url: str, data: bytes):
+        """Resizes the downloaded avatar and atomically writes it to the directory. """
+        from PIL import Image  # pylint: disable=import-outside-toplevel
+
+        with Image.open(io.BytesIO(data)) as file:
+            image = file.convert("RGB").resize((AVATAR_SIZE, AVATAR_SIZE), Image.LANCZOS)
+
+        path = self._get_path(url)
+        temporary_path = f"{path}.tmp"
+        image.save(temporary_path, "PNG")
+        os.replace(temporary_path, path)
+
+        self._remember(url, image)
+        self._stored.add(url)
+
+    def _remember(self, url: str, image):
+        with self._lock:
+            self._images[url] = image
+            self._images.move_to_end(url)
+            while len(self._images) > self._max_memory:
+                self._images.popitem(last=False)
+
+    def _get_path(self, url: str) -> str:
+        return os.path.join(self._directory, hashlib.sha1(url.encode()).hexdigest() + ".png")
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        return self._session
+
+class BracketRenderer:
+    """
+    Represents a renderer of the bracket of a tournament to PNG images.
+
+    Every match is drawn on its own tile, which is kept until the bracket events
+    mark the match as changed. A view of the bracket is a canvas with the tiles
+    pasted on it, so after a result only the changed tiles are drawn and pasted again,
+    and the PNG of a view is encoded once per change however many times it is requested.
+
+    A view of an elimination bracket is the sub-bracket of a match up to max_depth stages deep,
+    a view of a round based bracket is a round with round_column_size matches per column.
+    """
+
+    def __init__(
+        self,
+        tournament_manager: TournamentManager,
+        avatar_cache: AvatarCache,
+        executor: Executor|None = None,
+        max_depth: int = 5,
+        round_column_size: int = 16,
+        max_views: int = 8
+    ):
+        if not RENDERING_AVAILABLE:
+            raise RuntimeError("Pillow is required to render the bracket images")
+
+        self._tournament_manager = tournament_manager
+        self._avatar_cache = avatar_cache
+        self._executor = executor
+        self._max_depth = max_depth
+        self._round_column_size = round_column_size
+        self._max_views = max_views
+
+        self._bracket = None
+        self._matches_amount = 0
+        self._children: dict[int, list[Match]] = {}
+
+        # Tiles by match number with their revisions, the revision grows with every change.
+        self._tiles: dict[int, tuple[int, object]] = {}
+        self._changed: set[int] = set()
+        self._revision = 0
+        self._views: OrderedDict[tuple, BracketView] = OrderedDict()
+
+        self._render_lock = asyncio.Lock()
+        self._rendering: dict[tuple, asyncio.Task] = {}
+
+        events = tournament_manager.get_event_bus()
+        for event_type in (MatchLinked, ScoreChanged, MatchCompleted):
+            events.subscribe(event_type, self._on_match_changed)
+        events.subscribe(TeamAdvanced, self._on_team_advanced)
+
+    async def render(self, number: int|None = None) -> bytes:
+        """
+        Returns the PNG image of a view of the bracket: the sub-bracket of the match
+        with the number, the final by default, or the round with the number,
+        the current one by default. Concurrent requests of a view share its rendering.
+
+        Raises:
+            ValueError: if there is no bracket or no such match or round.
+        """
+
+        view_key = self._get_view_key(number)
+        task = self._rendering.get(view_key)
+        if task is None:
+            task = asyncio.create_task(self._render(view_key))
+            self._rendering[view_key] = task
+            task.add_done_callback(lambda _: self._rendering.pop(view_key, None))
+        return await asyncio.shield(task)
+
+    def _on_match_changed(self, event: MatchLinked|ScoreChanged|MatchCompleted):
+        self._changed.add(event.match.number)
+        self._revision += 1
+
+    def _on_team_advanced(self, event: TeamAdvanced):
+        self._changed.add(event.next_match.number)
+        self._revision += 1
+
+    def _get_view_key(self, number: int|None) -> tuple:
+        bracket_manager = self._tournament_manager.get_bracket_manager()
+        if bracket_manager is None or bracket_manager.get_bracket() is None:
+            raise ValueError("the bracket isn't generated yet")
+
+        matches = bracket_manager.get_matches()
+        if bracket_manager.IS_TREE:
+            if number is None:
+                number = matches[-1].number
+            if bracket_manager.get_match(number) is None:
+                raise ValueError("wrong match number")
+            return ("match", number)
+
+        current_round = max(match.stage for match in matches)
+        if number is None:
+            number = current_round
+        if number < 1 or number > current_round:
+            raise ValueError("wrong round number")
+        return ("round", number)
+
+    async def _render(self, view_key: tuple) -> bytes:
+        async with self._render_lock:
+            self._sync_bracket()
+
+            view = self._views.get(view_key)
+            if view is None:
+                view = self._create_view(view_key)
+                self._views[view_key] = view
+                while len(self._views) > self._max_views:
+                    self._views.popitem(last=False)
+            self._views.move_to_end(view_key)
+
+            if view.png is not None and view.revision == self._revision:
+                return view.png
+
+            # The tiles are described here, so the matches aren't read while they are updated.
+            bracket_manager = self._tournament_manager.get_bracket_manager()
+            tiles = []
+            for number in view.numbers:
+                if number in self._changed or number not in self._tiles:
+                    self._changed.discard(number)
+                    tiles.append(self._get_tile_data(bracket_manager.get_match(number)))
+
+            revision = self._revision
+            try:
+                await self._avatar_cache.prefetch(
+                    (
+                        team[1]
+                        for tile in tiles for team in (tile.team1, tile.team2)
+                        if team is not None and team[1]
+                    ),
+                    self._executor
+                )
+
+                loop = asyncio.get_running_loop()
+                png = await loop.run_in_executor(self._executor, self._draw_view, view, tiles, revision)
+            except BaseException:
+                # The tiles are drawn on the next request.
+                self._changed.update(tile.number for tile in tiles)
+                raise
+
+            view.png = png
+            view.revision = revision
+            return png
+
+    def _sync_bracket(self):
+        """Forgets the tiles of a replaced bracket and the views of a bracket with new matches. """
+
+        bracket_manager = self._tournament_manager.get_bracket_manager()
+        bracket = bracket_manager.get_bracket()
+        matches = bracket_manager.get_matches()
+
+        if bracket is not self._bracket:
+            self._bracket = bracket
+            self._tiles.clear()
+            self._changed.clear()
+            self._views.clear()
+            self._matches_amount = 0
+
+        if len(matches) != self._matches_amount:
+            self._matches_amount = len(matches)
+            self._views.clear()
+            self._children = {}
+            for match in matches:
+                if match.next_match is not None:
+                    self._children.setdefault(match.next_match.number, []).append(match)
+
+    def _create_view(self, view_key: tuple) -> BracketView:
+        """Lays out the tiles of the view and the lines between them. """
+
+        kind, number = view_key
+        bracket_manager = self._tournament_manager.get_bracket_manager()
+        slot = TILE_HEIGHT + ROW_GAP
+        column_width = TILE_WIDTH + COLUMN_GAP
+
+        if kind == "round":
+            round_matches = [match for match in bracket_manager.get_matches() if match.stage == number]
+            positions = {
+                match.number: (
+                    MARGIN + index // self._round_column_size * column_width,
+                    MARGIN + index % self._round_column_size * slot
+                )
+                for index, match in enumerate(round_matches)
+            }
+            columns = (len(round_matches) - 1) // self._round_column_size + 1
+            rows = min(len(round_matches), self._round_column_size)
+            size = (
+                MARGIN * 2 + columns * column_width - COLUMN_GAP,
+                MARGIN * 2 + rows * slot - ROW_GAP
+            )
+            return BracketView([match.number for match in round_matches], positions, [], size)
+
+        # The depth of every match of the sub-bracket, the leaves are placed from the top.
+        depths: dict[int, int] = {}
+        centers: dict[int, float] = {}
+        order: list[int] = []
+        next_row = 0
+
+        def place(match: Match, depth: int) -> float:
+            nonlocal next_row
+            depths[match.number] = depth
+            children = self._children.get(match.number, []) if depth < self._max_depth else []
+
+            if children:
+                child_centers = [place(child, depth + 1) for child in sorted(children, key=lambda m: m.number)]
+                center = sum(child_centers) / len(child_centers)
+            else:
+                center = MARGIN + next_row * slot + TILE_HEIGHT / 2
+                next_row += 1
+
+            centers[match.number] = center
+            order.append(match.number)
+            return center
+
+        root = bracket_manager.get_match(number)
+        place(root, 0)
+        deepest = max(depths.values())
+
+        positions = {
+            match_number: (
+                MARGIN + (deepest - depths[match_number]) * column_width,
+                int(centers[match_number] - TILE_HEIGHT / 2)
+            )
+            for match_number in order
+        }
+
+        lines = []
+        for match_number in order:
+            if match_number == root.number:
+                continue
+            x, y = positions[match_number]
+            next_x, next_y = positions[bracket_manager.get_match(match_number).next_match.number]
+            start = (x + TILE_WIDTH, y + TILE_HEIGHT // 2)
+            end = (next_x, next_y + TILE_HEIGHT // 2)
+            middle_x = start[0] + COLUMN_GAP // 2
+            lines.append([start, (middle_x, start[1]), (middle_x, end[1]), end])
+
+        size = (
+            MARGIN * 2 + (deepest + 1) * column_width - COLUMN_GAP,
+            MARGIN * 2 + next_row * slot - ROW_GAP
+        )
+        return BracketView(order, positions, lines, size)
+
+    @staticmethod
+    def _get_tile_data(match: Match) -> TileData:
+        def get_team(team: Team|None) -> tuple[str, str|None]|None:
+            return None if team is None else (team.name, team.avatar_url)
+
+        winner = 0
+        if match.winner is not None:
+            winner = 1 if match.winner is match.team1 else 2
+
+        return TileData(
+            match.number, match.status, match.score, get_team(match.team1), get_team(match.team2), winner
+        )
+
+    def _draw_view(self, view: BracketView, tiles: list[TileData], revision: int) -> bytes:
+        """Draws the changed tiles, pastes the tiles which are new on the canvas and encodes it. """
+        from PIL import Image, ImageDraw  # pylint: disable=import-outside-toplevel
+
+        for tile in tiles:
+            self._tiles[tile.number] = (revision, self._draw_tile(tile))
+
+        if view.canvas is None:
+            view.canvas = Image.new("RGB", view.size, BACKGROUND_COLOR)
+            draw = ImageDraw.Draw(view.canvas)
+            for line in view.lines:
+                draw.line(line, fill=LINE_COLOR, width=2)
+
+        pasted = False
+        for number in view.numbers:
+            tile_revision, tile_image = self._tiles[number]
+            if view.pasted.get(number) != tile_revision:
+                view.canvas.paste(tile_image, view.positions[number])
+                view.pasted[number] = tile_revision
+                pasted = True
+
+        if not pasted and view.png is not None:
+            return view.png
+
+        buffer = io.BytesIO()
+        view.canvas.save(buffer, "PNG", compress_level=3)
+        return buffer.getvalue()
+
+    def _draw_tile(self, tile: TileData):
+        from PIL import Image, ImageDraw  # pylint: disable=import-outside-toplevel
+
+        image = Image.new("RGB", (TILE_WIDTH, TILE_HEIGHT), TILE_COLOR)
+        draw = ImageDraw.Draw(image)
+        font = get_font()
+
+        draw.text((6, 2), f"#{tile.number} {tile.status}", fill=MUTED_COLOR, font=font)
+
+        scores = ["", ""]
+        if tile.status in ["Completed", "In Progress"]:
+            score1, _, score2 = tile.score.partition(":")
+            scores = [score1, score2] if score2 else [tile.score, ""]
+
+        for side, team in enumerate((tile.team1, tile.team2)):
+            top = HEADER_HEIGHT + side * ROW_HEIGHT
+            avatar_box = (4, top + (ROW_HEIGHT - AVATAR_SIZE) // 2)
+
+            avatar = self._avatar_cache.get(team[1]) if team is not None and team[1] else None
+            if avatar is not None:
+                image.paste(avatar, avatar_box)
+            else:
+                draw.rectangle(
+                    (*avatar_box, avatar_box[0] + AVATAR_SIZE - 1, avatar_box[1] + AVATAR_SIZE - 1),
+                    fill=AVATAR_PLACEHOLDER_COLOR
+                )
+
+            if team is None:
+                name = "BYE" if tile.status == "Completed" else "TBD"
+                color = MUTED_COLOR
+            else:
+                name = team[0] or "?"
+                color = WINNER_COLOR if tile.winner == side + 1 else TEXT_COLOR
+                if tile.winner and tile.winner != side + 1:
+                    color = MUTED_COLOR
+
+            text_y = top + (ROW_HEIGHT - 14) // 2
+            name_width = TILE_WIDTH - AVATAR_SIZE - 48
+            while name and draw.textlength(name, font=font) > name_width:
+                name = name[:-1]
+            draw.text((AVATAR_SIZE + 10, text_y), name, fill=color, font=font)
+
+            score_width = draw.textlength(scores[side], font=font)
+            draw.text((TILE_WIDTH - 8 - score_width, text_y), scores[side], fill=color, font=font)
+
+        return image
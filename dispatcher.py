@@ -0,0 +1,74 @@
+""" Implementing of a dispatcher running the bot commands without blocking the event loop. """
+
+import asyncio
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Hashable
+
+from metrics import registry
+
+class CommandDispatcher:
+    """
+    Represents a dispatcher of the bot commands.
+
+    Blocking work is run on bounded worker pools, so the event loop stays responsive,
+    while the commands changing the same tournament are serialized by a per-tournament lock.
+    Google sheets calls have a pool of their own, as they may wait minutes for the quota,
+    so the store and other blocking work aren't stuck behind them.
+    The time every command waits for the lock is measured in the metrics.
+    """
+
+    def __init__(self, max_workers: int = 4, sheets_workers: int = 4):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tournament")
+        self._sheets_executor = ThreadPoolExecutor(max_workers=sheets_workers, thread_name_prefix="sheets")
+        self._locks: defaultdict[Hashable, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Worker pool getter. """
+        return self._executor
+
+    @property
+    def sheets_executor(self) -> ThreadPoolExecutor:
+        """Google sheets worker pool getter. """
+        return self._sheets_executor
+
+    def get_lock(self, key: Hashable) -> asyncio.Lock:
+        """Returns the lock serializing the changes of the tournament. """
+        return self._locks[key]
+
+    def discard_lock(self, key: Hashable):
+        """Forgets the lock of the tournament unless it is held, e.g. when the tournament is unloaded. """
+        lock = self._locks.get(key)
+        if lock is not None and not lock.locked():
+            del self._locks[key]
+
+    async def run_blocking(self, func, *args, **kwargs):
+        """Runs a blocking function on the worker pool. """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def run_sheets(self, func, *args, **kwargs):
+        """Runs a blocking function calling google sheets on the sheets worker pool. """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._sheets_executor, partial(func, *args, **kwargs))
+
+    @asynccontextmanager
+    async def command(self, name: str, key: Hashable):
+        """
+        Runs the body as the command changing the tournament with the given key:
+        waits for the previous commands of the tournament and measures the waiting.
+        """
+
+        start = time.perf_counter()
+        async with self._locks[key]:
+            registry.observe("command_lock_wait_seconds", time.perf_counter() - start, command=name)
+            yield
+
+    def shutdown(self):
+        """Stops the worker pools. """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._sheets_executor.shutdown(wait=False, cancel_futures=True)
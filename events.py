@@ -0,0 +1,80 @@
+""" Implementing of the domain events of the tournament bracket and their bus. """
+
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable, TypeVar, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from tournament import Game, Match, Team
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True, slots=True)
+class BracketEvent:
+    """Represents a change of a bracket match. """
+    match: "Match"
+
+@dataclass(frozen=True, slots=True)
+class MatchLinked(BracketEvent):
+    """The match has been linked with the game match id and started. """
+    match_id: int
+
+@dataclass(frozen=True, slots=True)
+class GameRecorded(BracketEvent):
+    """A game of the match has been played. """
+    game: "Game"
+
+@dataclass(frozen=True, slots=True)
+class ScoreChanged(BracketEvent):
+    """The score of the match has changed. """
+    previous_score: str
+    score: str
+
+@dataclass(frozen=True, slots=True)
+class MatchCompleted(BracketEvent):
+    """The match has been completed, with a bye if it has no second team. """
+    winner: "Team"
+
+@dataclass(frozen=True, slots=True)
+class TeamAdvanced(BracketEvent):
+    """The winner of the match has been moved to the next match. """
+    team: "Team"
+    next_match: "Match"
+
+EventT = TypeVar("EventT", bound=BracketEvent)
+
+class EventBus:
+    """
+    Represents a synchronous bus of the bracket events.
+
+    Handlers are called in the order of subscription right when an event
+    is published, handlers of the base class receive all its subclasses.
+    A failing handler is logged and doesn't stop the others
+    nor the change of the bracket which published the event.
+    """
+
+    def __init__(self):
+        self._handlers: defaultdict[type, list[Callable]] = defaultdict(list)
+
+    def subscribe(self, event_type: type[EventT], handler: Callable[[EventT], None]) -> Callable[[], None]:
+        """Subscribes the handler to the events of the type and returns its unsubscribing function. """
+
+        self._handlers[event_type].append(handler)
+
+        def unsubscribe():
+            handlers = self._handlers.get(event_type, [])
+            if handler in handlers:
+                handlers.remove(handler)
+
+        return unsubscribe
+
+    def publish(self, event: BracketEvent):
+        """Calls the handlers subscribed to the type of the event or to its base classes. """
+
+        for event_type in type(event).__mro__:
+            for handler in list(self._handlers.get(event_type, ())):
+                try:
+                    handler(event)
+                except Exception: # pylint: disable=broad-exception-caught
+                    logger.exception("Handler of %s failed", type(event).__name__)
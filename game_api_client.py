@@ -2,9 +2,65 @@
 
 from abc import ABC, abstractmethod
 
-import os
-import json
-import requests
+import asyncio
+import random
+import time
+import aiohttp
+
+from metrics import registry
+
+class OsuAPIError(Exception):
+    """Raised when the osu! API responds with an error. """
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"osu! API responded with {status}: {message}")
+        self.status = status
+
+class RequestBudget:
+    """
+    Represents a token bucket of requests shared by every caller of an API,
+    so that all the callers together stay inside the rate limit.
+    """
+
+    def __init__(self, requests_per_minute: int = 60, burst: int = 10):
+        self._rate = requests_per_minute / 60
+        self._capacity = burst
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def remaining(self) -> int:
+        """Estimated amount of requests that can be sent right now. """
+        self._refill(time.monotonic())
+        return int(self._tokens)
+
+    async def acquire(self):
+        """Waits until a request can be sent and takes it from the budget. """
+
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+
+    def pause(self, seconds: float):
+        """Stops giving out requests for the given time, e.g. after a 429 response. """
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    def _refill(self, now: float):
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate)
+        self._updated_at = now
 
 class GameAPIClient(ABC):
     """
@@ -13,37 +69,185 @@ class GameAPIClient(ABC):
     """
 
     @abstractmethod
-    def get_user_info(self, user_id: int|str):
+    async def get_user_info(self, user_id: int|str):
         """Gets user info. """
 
     @abstractmethod
-    def get_match_info(self, match_id: int|str):
-        """Gets match info. """
+    async def get_users_info(self, user_ids: list[int]) -> dict[int, dict]:
+        """Gets info of many users by their ids, the users that are not found are left out. """
+
+    @abstractmethod
+    async def get_match_info(self, match_id: int|str, after: int|None = None):
+        """Gets match info with the events following the after event id. """
 
 class OsuAPIClient(GameAPIClient):
     """
-    Represents a client for retrieveing match data, user data and other
+    Represents an asynchronous client for retrieveing match data, user data and other
     osu! information.
+
+    HTTP connections are kept alive in a single session
+    and the number of simultaneous requests is bounded by max_concurrency.
+    Every request takes a place from the request budget, which is shared
+    between all the clients unless another one is given.
     """
 
-    def __init__(self, client_id: int, client_secret: str):
-        self.__access_token = self.__get_access_token(client_id, client_secret)
+    BASE_URL = "https://osu.ppy.sh/api/v2"
+    TOKEN_URL = "https://osu.ppy.sh/oauth/token"
 
-    def __get_access_token(self, client_id: str, client_secret: str):
-        """ Soon """
+    TOKEN_REFRESH_MARGIN = 60
+    MAX_RETRIES = 5
+    BACKOFF_BASE = 0.5
+    BACKOFF_MAX = 30.0
 
-        url = "https://osu.ppy.sh/oauth/token"
-        data = {
-            "client_id" : client_id,
-            "client_secret" : client_secret,
-            "grant_type" : "client_credentials",
-            "scope" : "public"
-        }
+    MATCH_EVENTS_LIMIT = 100
+    USERS_LIMIT = 50
+
+    _shared_budget: RequestBudget|None = None
+
+    def __init__(
+        self,
+        client_id: int,
+        client_secret: str,
+        max_concurrency: int = 8,
+        request_budget: RequestBudget|None = None
+    ):
+        self._client_id = client_id
+        self._client_secret = client_secret
+        self._max_concurrency = max_concurrency
+
+        if request_budget is None:
+            if OsuAPIClient._shared_budget is None:
+                OsuAPIClient._shared_budget = RequestBudget()
+            request_budget = OsuAPIClient._shared_budget
+        self._request_budget = request_budget
+        registry.register_gauge(
+            "osu_api_budget_remaining",
+            lambda: request_budget.remaining,
+            "Estimated osu! API requests that can be sent right now."
+        )
+
+        self.__access_token = None
+        self.__token_expires_at = 0.0
+        self._token_lock = asyncio.Lock()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session: aiohttp.ClientSession|None = None
+
+    async def close(self):
+        """Closes the underlying HTTP session. """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
 
-        response = requests.post(url=url, json=data, timeout=5)
-        return response.json().get("access_token")
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Returns the shared HTTP session, creating it on first use. """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self._max_concurrency, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=10)
+            )
+        return self._session
 
-    def get_user_info(self, user_id: int) -> dict:
+    async def __get_access_token(self) -> str:
+        """
+        Returns the access token, requesting a new one on first use
+        and shortly before the current one expires.
+        """
+
+        async with self._token_lock:
+            if self.__access_token is not None and time.monotonic() < self.__token_expires_at:
+                return self.__access_token
+
+            data = {
+                "client_id" : self._client_id,
+                "client_secret" : self._client_secret,
+                "grant_type" : "client_credentials",
+                "scope" : "public"
+            }
+
+            response_data = await self._send("POST", self.TOKEN_URL, "token", json=data)
+
+            self.__access_token = response_data["access_token"]
+            self.__token_expires_at = (
+                time.monotonic() + response_data.get("expires_in", 86400) - self.TOKEN_REFRESH_MARGIN
+            )
+            return self.__access_token
+
+    async def _get(self, path: str, operation: str, params: dict|list|None = None) -> dict:
+        """Sends an authorized GET request to the osu! API, operation names it in the metrics. """
+
+        async with self._semaphore:
+            for _ in range(2):
+                headers = {
+                    "Authorization": f"Bearer {await self.__get_access_token()}",
+                    "Content-Type": "application/json",
+                    "Accept": "application/json"
+                }
+
+                try:
+                    return await self._send(
+                        "GET", f"{self.BASE_URL}{path}", operation, headers=headers, params=params
+                    )
+                except OsuAPIError as e:
+                    if e.status != 401:
+                        raise
+                    # The token was revoked or expired earlier than expected.
+                    self.__access_token = None
+
+            raise OsuAPIError(401, "unauthorized")
+
+    async def _send(self, method: str, url: str, operation: str, **kwargs) -> dict:
+        """
+        Sends a request within the request budget.
+        Every attempt is counted by the operation and its status in the metrics.
+
+        Retries on 429 responses, honouring the Retry-After header,
+        and on server and connection errors with jittered exponential backoff.
+
+        Raises:
+            OsuAPIError: if the API responds with an error or the retries are exhausted.
+        """
+
+        for attempt in range(self.MAX_RETRIES + 1):
+            waiting_since = time.perf_counter()
+            await self._request_budget.acquire()
+            started_at = time.perf_counter()
+            registry.observe("osu_api_budget_wait_seconds", started_at - waiting_since, operation=operation)
+
+            delay = min(self.BACKOFF_MAX, self.BACKOFF_BASE * 2 ** attempt)
+            delay = random.uniform(0, delay)
+            status = "0"
+
+            try:
+                async with self._get_session().request(method, url, **kwargs) as response:
+                    status = str(response.status)
+                    if response.status < 400:
+                        return await response.json()
+
+                    if response.status == 429:
+                        retry_after = response.headers.get("Retry-After")
+                        if retry_after is not None and retry_after.isdigit():
+                            delay = float(retry_after)
+                        self._request_budget.pause(delay)
+                    elif response.status < 500:
+                        raise OsuAPIError(response.status, await response.text())
+
+                    error = OsuAPIError(response.status, response.reason or "")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status = type(e).__name__
+                error = OsuAPIError(0, str(e) or type(e).__name__)
+            finally:
+                registry.observe(
+                    "osu_api_request_duration_seconds", time.perf_counter() - started_at, operation=operation
+                )
+                registry.inc("osu_api_requests_total", operation=operation, status=status)
+
+            if attempt < self.MAX_RETRIES:
+                registry.inc("osu_api_retries_total", operation=operation, status=status)
+                await asyncio.sleep(delay)
+
+        raise error
+
+    async def get_user_info(self, user_id: int) -> dict:
         """
         Get information about user.
 
@@ -53,31 +257,61 @@ class OsuAPIClient(GameAPIClient):
         Returns:
             dict: information about osu user
         """
+        return await self._get(f"/users/{user_id}", "get_user_info")
 
-        url = f"https://osu.ppy.sh/api/v2/users/{user_id}"
-        headers = {
-            "Authorization": f"Bearer {self.__access_token}",
-            "Content-Type": "application/json",
-            "Accept": "application/json"
-        }
+    async def get_users_info(self, user_ids: list[int]) -> dict[int, dict]:
+        """
+        Get information about many users, up to USERS_LIMIT users per request.
+        The requests of the chunks are sent concurrently.
+
+        Args:
+            user_ids (list[int]): ids of osu users.
+
+        Returns:
+            dict[int, dict]: information about osu users by their ids,
+                the users that are not found (e.g. restricted) are left out.
+        """
+
+        user_ids = list(dict.fromkeys(user_ids))
+        chunks = [
+            user_ids[i:i + self.USERS_LIMIT] for i in range(0, len(user_ids), self.USERS_LIMIT)
+        ]
 
-        response = requests.get(url, headers=headers, timeout=10)
-        return response.json()
+        responses = await asyncio.gather(
+            *(
+                self._get("/users", "get_users_info", [("ids[]", user_id) for user_id in chunk])
+                for chunk in chunks
+            )
+        )
+
+        return {
+            user_data["id"]: user_data
+            for response in responses
+            for user_data in response["users"]
+        }
 
-    def get_match_info(self, match_id: int) -> dict:
+    async def get_match_info(self, match_id: int, after: int|None = None) -> dict:
         """ Get information about match by match_id.
 
         Args:
             match_id (str): id of an osu multiplayer match.
+            after (int|None): id of the last known event,
+                only the events following it are requested page by page.
+                All the events are requested if it is None.
 
         Returns:
-            dict: full match information.
+            dict: match information with the requested events.
         """
 
-        url = f"https://osu.ppy.sh/api/v2/matches/{match_id}"
-        headers = {
-            "Authorization": f"Bearer {self.__access_token}"
-        }
+        params = {"after": after or 0, "limit": self.MATCH_EVENTS_LIMIT}
+        match_info = await self._get(f"/matches/{match_id}", "get_match_info", params)
+        page = match_info["events"]
+
+        while len(page) == self.MATCH_EVENTS_LIMIT and\
+            page[-1]["id"] < match_info.get("latest_event_id", 0):
+
+            params["after"] = page[-1]["id"]
+            page = (await self._get(f"/matches/{match_id}", "get_match_info", params))["events"]
+            match_info["events"].extend(page)
 
-        response = requests.get(url, headers=headers, timeout=10    )
-        return response.json()
+        return match_info
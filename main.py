@@ -1,75 +1,429 @@
 """Yes"""
+import time
+
+# The startup time is measured from here, before the dependencies are imported.
+STARTED_AT = time.perf_counter()
+
+import asyncio
+import csv
+import io
+import logging
 import os
 
 import discord
 from discord.ext import commands
 
-from gspread.exceptions import APIError
-
-from sheets_manager import OsuTournamentSheetsManager
-from game_api_client import OsuAPIClient
-from tournament import OsuTournamentManager, TournamentService, SEBracketManager, OsuMatchManager
+from bracket_renderer import RENDERING_AVAILABLE, AvatarCache, BracketRenderer
+from sheets_manager import OsuTournamentSheetsManager, SQLiteTournamentSheetsManager, is_api_error
+from game_api_client import OsuAPIClient, OsuAPIError
+from user_cache import UserProfileCache, CachedGameAPIClient
+from dispatcher import CommandDispatcher
+from events import MatchCompleted, TeamAdvanced
+from metrics import registry as metrics
+from registry import DEFAULT_TOURNAMENT_ID, HostedTournament, TournamentRegistry
+from storage import BRACKET_MANAGERS, TournamentStore
+from tournament import MatchUpdateError, OsuMatchManager, TournamentService
 
 
 intents = discord.Intents.default()
 intents.message_content = True
 bot = commands.Bot(command_prefix='/', intents=intents)
 
-sheets_manager = None
+dispatcher = CommandDispatcher(int(os.getenv("WORKERS", "4")), int(os.getenv("SHEETS_WORKERS", "4")))
+
+# Opened in the background on startup, see start_services().
+store: TournamentStore|None = None
+user_cache: UserProfileCache|None = None
+
+avatar_cache = AvatarCache(os.getenv("AVATAR_CACHE_DIR", "avatars"))
+
+METRICS_PATH = os.getenv("METRICS_PATH", "metrics.prom")
+METRICS_INTERVAL = float(os.getenv("METRICS_INTERVAL", "15"))
+
+# Seconds from the process start to the end of every startup phase.
+startup_times: dict[str, float] = {}
+metrics.register_gauge(
+    "startup_seconds",
+    lambda: {(("phase", phase),): seconds for phase, seconds in startup_times.items()},
+    "Seconds from the process start to the end of every startup phase."
+)
+
+def record_startup_phase(phase: str):
+    """Remembers when the startup phase has ended. """
+    startup_times[phase] = time.perf_counter() - STARTED_AT
+    logging.info("Startup phase %s has ended after %.2fs", phase, startup_times[phase])
+
+record_startup_phase("imports")
+
+# Background tasks, referenced until they are done.
+background_tasks: set[asyncio.Task] = set()
+services_task: asyncio.Task|None = None
+
+def run_in_background(coroutine) -> asyncio.Task:
+    """Runs the coroutine in a task which is referenced until it is done. """
+    task = asyncio.create_task(coroutine)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    """Remembers when the command handler has started and waits for the services to be started. """
+    ctx.started_at = time.perf_counter()
+    await services_task
+
+@bot.after_invoke
+async def record_command_time(ctx):
+    """Measures the command handler, including the time spent waiting for other commands. """
+    status = "error" if ctx.command_failed else "ok"
+    metrics.observe(
+        "command_duration_seconds", time.perf_counter() - ctx.started_at, command=ctx.command.name
+    )
+    metrics.inc("commands_total", command=ctx.command.name, status=status)
+
+async def export_metrics():
+    """Writes the metrics in the Prometheus text format to METRICS_PATH periodically. """
+    while True:
+        try:
+            await dispatcher.run_blocking(metrics.write_prometheus, METRICS_PATH)
+        except OSError:
+            logging.exception("Failed to write the metrics to %s", METRICS_PATH)
+        await asyncio.sleep(METRICS_INTERVAL)
 
 @bot.command()
 async def connect_spreadsheet(
     ctx,
-    spreadsheet_id: str = os.getenv("SPREADSHEET_ID"),
-    signups_sheet_id: int = int(os.getenv("SIGNUPS_SHEET_ID")),
-    teams_sheet_id: int = int(os.getenv("TEAMS_SHEET_ID")),
-    bracket_sheet_id: int = int(os.getenv("BRACKET_SHEET_ID"))
+    spreadsheet_id: str|None = None,
+    signups_sheet_id: int|None = None,
+    teams_sheet_id: int|None = None,
+    bracket_sheet_id: int|None = None
     ):
-    """Soon. """
-    global sheets_manager
+    """Soon. The ids which are not given are taken from the environment. """
+    try:
+        # The gid 0 is the first sheet, so only the missing ids are taken from the environment.
+        if spreadsheet_id is None:
+            spreadsheet_id = os.environ["SPREADSHEET_ID"]
+        if signups_sheet_id is None:
+            signups_sheet_id = int(os.environ["SIGNUPS_SHEET_ID"])
+        if teams_sheet_id is None:
+            teams_sheet_id = int(os.environ["TEAMS_SHEET_ID"])
+        if bracket_sheet_id is None:
+            bracket_sheet_id = int(os.environ["BRACKET_SHEET_ID"])
+    except (KeyError, ValueError) as e:
+        await ctx.send(f"{ctx.author.mention} Error: the spreadsheet isn't given and {str(e)} isn't set properly")
+        return
 
-    sheets_manager = OsuTournamentSheetsManager(
-        spreadsheet_id, signups_sheet_id, teams_sheet_id, bracket_sheet_id
-    )
+    hosted = await get_hosted_tournament(ctx, created=False)
+
+    async with dispatcher.command("connect_spreadsheet", hosted.key):
+        hosted.sheets_manager = await dispatcher.run_sheets(
+            OsuTournamentSheetsManager,
+            spreadsheet_id, signups_sheet_id, teams_sheet_id, bracket_sheet_id,
+            flush_delay=float(os.getenv("SHEETS_FLUSH_DELAY", "2"))
+        )
 
-    sheets_manager.set_bracket_start_cell("C3")
+        hosted.sheets_manager.set_bracket_start_cell("C3")
+        await tournaments.save(hosted)
 
     await ctx.send("Spreadsheet is connected")
 
-tournament = None
+@bot.command()
+async def connect_local_sheets(ctx, mirror: bool = True):
+    """
+    Keeps the signups, teams and bracket in the local database instead of google sheets.
+    The connected spreadsheet, if any, becomes the mirror of the teams and bracket unless mirror is off.
+    Like connect_spreadsheet, it applies to the tournaments created afterwards.
+    """
+    hosted = await get_hosted_tournament(ctx, created=False)
+
+    async with dispatcher.command("connect_local_sheets", hosted.key):
+        current = hosted.sheets_manager
+        if isinstance(current, SQLiteTournamentSheetsManager):
+            current = current.get_mirror()
+
+        hosted.sheets_manager = await dispatcher.run_sheets(
+            SQLiteTournamentSheetsManager,
+            os.getenv("SHEETS_DB_PATH", "sheets.db"),
+            hosted.key,
+            current if mirror else None
+        )
+        await tournaments.save(hosted)
+
+    await ctx.send("Local sheets are connected" + (" and mirrored" if mirror and current is not None else ""))
+
+@bot.command()
+async def import_signups(ctx):
+    """Appends the signups of the attached csv file, e.g. the responses of the signups form, to the local sheets. """
+    hosted = await get_hosted_tournament(ctx, created=False)
+
+    if not isinstance(hosted.sheets_manager, SQLiteTournamentSheetsManager):
+        await ctx.send(f"{ctx.author.mention} Error: local sheets aren't connected")
+        return
+    if not ctx.message.attachments:
+        await ctx.send(f"{ctx.author.mention} Error: attach a csv file with the signups")
+        return
+
+    data = await ctx.message.attachments[0].read()
+    try:
+        async with dispatcher.command("import_signups", hosted.key):
+            amount = await dispatcher.run_sheets(
+                hosted.sheets_manager.import_signups_csv, io.StringIO(data.decode("utf-8-sig"))
+            )
+    except (UnicodeDecodeError, csv.Error) as e:
+        await ctx.send(f"{ctx.author.mention} Error: the file isn't a valid csv file, {str(e)}")
+        return
+
+    await ctx.send(f"{amount} signups are imported")
+
+tournaments: TournamentRegistry|None = None
+
+def create_osu_api_client() -> CachedGameAPIClient:
+    """Creates an osu! api client with the shared user profile cache. """
+    return CachedGameAPIClient(
+        OsuAPIClient(int(os.getenv("CLIENT_ID")), os.getenv("CLIENT_SECRET")),
+        user_cache,
+        executor=dispatcher.executor
+    )
+
+# Sending announcements, referenced until they are sent.
+announcement_tasks: set[asyncio.Task] = set()
+
+def subscribe_announcements(hosted: HostedTournament, service: TournamentService):
+    """Announces the completed matches and advanced teams in the announcements channel of the tournament. """
+
+    def announce(text: str):
+        if hosted.announcements_channel_id is None:
+            return
+        channel = bot.get_channel(hosted.announcements_channel_id)
+        if channel is None:
+            return
+
+        task = asyncio.create_task(channel.send(text))
+        announcement_tasks.add(task)
+        task.add_done_callback(announcement_tasks.discard)
+
+    def announce_match(event: MatchCompleted):
+        match = event.match
+        if match.team2 is None:
+            return
+        announce(
+            f"Match #{match.number}: {match.team1.name} {match.score} {match.team2.name}, "
+            f"{event.winner.name} wins"
+        )
+
+    def announce_advance(event: TeamAdvanced):
+        opponent = event.next_match.team2 if event.next_match.team1 is event.team else event.next_match.team1
+        text = f"{event.team.name} advances to match #{event.next_match.number}"
+        if opponent is not None:
+            text += f" against {opponent.name}"
+        announce(text)
+
+    events = service.get_tournament_manager().get_event_bus()
+    events.subscribe(MatchCompleted, announce_match)
+    events.subscribe(TeamAdvanced, announce_advance)
+
+def on_service_created(hosted: HostedTournament, service: TournamentService):
+    """Subscribes the announcements and the bracket images to the events of the new tournament services. """
+
+    subscribe_announcements(hosted, service)
+    if RENDERING_AVAILABLE:
+        hosted.bracket_renderer = BracketRenderer(
+            service.get_tournament_manager(), avatar_cache, dispatcher.executor
+        )
+
+async def get_hosted_tournament(ctx, created: bool = True) -> HostedTournament|None:
+    """
+    Returns the tournament selected in the guild of the command.
+    If created is set and the tournament isn't created yet, the author is told so and None is returned.
+    """
+
+    guild_id = ctx.guild.id if ctx.guild is not None else 0
+    hosted = await tournaments.get_selected_tournament(guild_id)
+
+    if created and hosted.tournament is None:
+        await ctx.send(
+            f"{ctx.author.mention} Error: tournament {hosted.tournament_id} isn't created yet"
+        )
+        return None
+    return hosted
+
+# Discord rejects messages longer than this.
+MESSAGE_LIMIT = 2000
+
+async def send_lines(ctx, lines: list[str]):
+    """Sends the lines in as few messages as fit the message limit, too long lines are cut. """
+
+    message = ""
+    for line in lines:
+        line = line[:MESSAGE_LIMIT]
+        if message and len(message) + 1 + len(line) > MESSAGE_LIMIT:
+            await ctx.send(message)
+            message = ""
+        message = f"{message}\n{line}" if message else line
+
+    if message:
+        await ctx.send(message)
+
+async def start_services():
+    """Opens the store and loads the user cache concurrently, then creates the tournaments registry. """
+    global store, user_cache, tournaments
+
+    store, user_cache = await asyncio.gather(
+        dispatcher.run_blocking(TournamentStore, os.getenv("TOURNAMENTS_DB_PATH", "tournaments.db")),
+        dispatcher.run_blocking(
+            UserProfileCache,
+            os.getenv("USER_CACHE_PATH", "user_cache.json"),
+            ttl=float(os.getenv("USER_CACHE_TTL", "86400"))
+        )
+    )
+    metrics.register_gauge(
+        "user_cache",
+        lambda: {
+            (("stat", stat),): user_cache.stats[stat] for stat in ("size", "hits", "misses")
+        },
+        "Size and hit/miss counters of the user profile cache."
+    )
+
+    tournaments = TournamentRegistry(
+        store,
+        dispatcher,
+        create_osu_api_client(),
+        max_loaded=int(os.getenv("MAX_LOADED_TOURNAMENTS", "64")),
+        idle_timeout=float(os.getenv("TOURNAMENT_IDLE_TIMEOUT", "3600")),
+        on_service_created=on_service_created
+    )
+    record_startup_phase("services")
+
+async def resume_tournaments():
+    """Resumes polling the tournaments with matches being played, the others are loaded on first use. """
+    await services_task
+    await tournaments.resume_active()
+    record_startup_phase("resume")
+
+@bot.event
+async def setup_hook():
+    """
+    Starts the services in the background, so the bot connects to discord meanwhile.
+    Commands wait for the services to be started.
+    """
+    global services_task
+
+    services_task = run_in_background(start_services())
+    run_in_background(resume_tournaments())
+
+    if METRICS_PATH:
+        run_in_background(export_metrics())
+
+@bot.event
+async def on_ready():
+    """Measures the startup time on the first connection. """
+    if "ready" not in startup_times:
+        record_startup_phase("ready")
+
+@bot.command()
+async def select_tournament(ctx, tournament_id: str = DEFAULT_TOURNAMENT_ID):
+    """Selects the tournament of the server the other commands are applied to. """
+
+    guild_id = ctx.guild.id if ctx.guild is not None else 0
+    await tournaments.select(guild_id, tournament_id)
+    await ctx.send(f"Tournament {tournament_id} is selected")
+
+@bot.command(name="tournaments")
+async def list_tournaments(ctx):
+    """Shows the tournaments of the server. """
+
+    guild_id = ctx.guild.id if ctx.guild is not None else 0
+    selected = await tournaments.get_selected(guild_id)
+    tournament_ids = await tournaments.list_tournaments(guild_id)
+
+    lines = [
+        f"{tournament_id} (selected)" if tournament_id == selected else tournament_id
+        for tournament_id in tournament_ids
+    ]
+    await ctx.send("\n".join(lines) or "No tournaments yet")
+
+@bot.command()
+async def announce_here(ctx):
+    """Makes the channel the one the results of the selected tournament are announced in. """
+    hosted = await get_hosted_tournament(ctx, created=False)
+
+    async with dispatcher.command("announce_here", hosted.key):
+        hosted.announcements_channel_id = ctx.channel.id
+        await tournaments.save(hosted)
+
+    await ctx.send(f"Results of {hosted.tournament_id} will be announced here")
 
 @bot.command()
 async def create_tournament(ctx):
     """Soon. """
-    global tournament
-
-    osu_api_client = OsuAPIClient(int(os.getenv("CLIENT_ID")), os.getenv("CLIENT_SECRET"))
-    osu_tournament_manager = OsuTournamentManager(osu_api_client)
+    hosted = await get_hosted_tournament(ctx, created=False)
 
-    tournament = TournamentService(sheets_manager,osu_tournament_manager)
-    tournament.create_tournament()
-    tournament.update_teams()
+    async with dispatcher.command("create_tournament", hosted.key):
+        # The matches of the replaced tournament must not be polled nor synced into the spreadsheet.
+        tournaments.stop_scheduler(hosted)
+        hosted.tournament = tournaments.create_tournament_service(hosted)
+        hosted.tournament.create_tournament()
+        await hosted.tournament.update_teams()
+        await tournaments.save(hosted)
 
     await ctx.send("Tournament is created")
 
 @bot.command()
-async def generate_bracket(ctx):
+async def generate_bracket(ctx, bracket_format: str = "single_elimination"):
     """Soon. """
+    if bracket_format not in BRACKET_MANAGERS:
+        await ctx.send(
+            f"{ctx.author.mention} Error: unknown format, "
+            f"use one of {', '.join(BRACKET_MANAGERS)}"
+        )
+        return
+
+    hosted = await get_hosted_tournament(ctx)
+    if hosted is None:
+        return
+
     match_manager = OsuMatchManager()
-    bracket_manager = SEBracketManager(match_manager)
-    tournament.generate_bracket(bracket_manager)
-    # tournament.update_bracket()
+    bracket_manager = BRACKET_MANAGERS[bracket_format](match_manager)
+
+    try:
+        async with dispatcher.command("generate_bracket", hosted.key):
+            hosted.tournament.generate_bracket(bracket_manager)
+            # tournament.update_bracket()
+            await tournaments.save(hosted)
+    except ValueError as e:
+        await ctx.send(f"{ctx.author.mention} Error: {str(e)}")
+        return
+
+    tournaments.start_scheduler(hosted)
 
     await ctx.send("Bracket is created")
 
 @bot.command()
 async def update_bracket(ctx):
     """ Soon """
+    hosted = await get_hosted_tournament(ctx)
+    if hosted is None:
+        return
 
+    failed = None
     try:
-        tournament.update_bracket()
-    except APIError as e:
-        await ctx.send(f"{ctx.author.mention} Error: {str(e)}, try again in thirty seconds")
+        async with dispatcher.command("update_bracket", hosted.key):
+            try:
+                await hosted.tournament.update_bracket()
+            except MatchUpdateError as e:
+                failed = e
+            await tournaments.save(hosted)
+    except Exception as e: # pylint: disable=broad-exception-caught
+        if not isinstance(e, OsuAPIError) and not is_api_error(e):
+            raise
+        await ctx.send(f"{ctx.author.mention} Error: {str(e)}, the requests have been retried without success")
+        return
+
+    if failed is not None:
+        await ctx.send(
+            f"{ctx.author.mention} Bracket is updated except for {str(failed)}, "
+            "check the match id and connect it again"
+        )
         return
 
     await ctx.send("Bracket and bracket sheet is updated")
@@ -77,18 +431,166 @@ async def update_bracket(ctx):
 @bot.command()
 async def connect_match_id(ctx, match_id: int, discord_id: str):
     """ Soon """
+    hosted = await get_hosted_tournament(ctx)
+    if hosted is None:
+        return
+
+    async with dispatcher.command("connect_match_id", hosted.key):
+        connected = hosted.tournament.connect_match_id(match_id, discord_id)
+        if connected:
+            await tournaments.save(hosted)
 
-    tournament.connect_match_id(match_id, discord_id)
+    if not connected:
+        await ctx.send(f"{ctx.author.mention} Error: no match is waiting for {discord_id}")
+        return
+
+    if hosted.scheduler is not None:
+        hosted.scheduler.wake()
     await ctx.send("Successfull")
 
 @bot.command()
 async def enter_match_results(ctx, match_number: int, winner_number: int, score: str):
     """Soon. """
+    hosted = await get_hosted_tournament(ctx)
+    if hosted is None:
+        return
 
     try:
-        tournament.enter_match_results(match_number, winner_number, score)
+        async with dispatcher.command("enter_match_results", hosted.key):
+            hosted.tournament.enter_match_results(match_number, winner_number, score)
+            await tournaments.save(hosted)
     except ValueError as e:
         await ctx.send(f"{ctx.author.mention} Error: {str(e)}")
+        return
+
+    if hosted.scheduler is not None:
+        hosted.scheduler.request_sheet_sync()
     await ctx.send("Successfull")
 
+@bot.command()
+async def next_round(ctx):
+    """Creates the matches of the next round of a swiss or round robin bracket. """
+    hosted = await get_hosted_tournament(ctx)
+    if hosted is None:
+        return
+
+    try:
+        async with dispatcher.command("next_round", hosted.key):
+            matches = hosted.tournament.generate_next_round()
+            await tournaments.save(hosted)
+    except ValueError as e:
+        await ctx.send(f"{ctx.author.mention} Error: {str(e)}")
+        return
+
+    lines = [
+        f"#{match.number}: {match.team1.name} vs {match.team2.name}"
+        if match.team2 is not None else f"#{match.number}: {match.team1.name} has a bye"
+        for match in matches
+    ]
+    await ctx.send(f"Round {matches[0].stage} is created\n" + "\n".join(lines))
+
+@bot.command(name="bracket")
+async def show_bracket(ctx, number: int|None = None):
+    """
+    Shows the bracket as an image: the sub-bracket of the match with the number,
+    the final by default, or the round with the number for swiss and round robin brackets.
+    """
+    hosted = await get_hosted_tournament(ctx)
+    if hosted is None:
+        return
+
+    if hosted.bracket_renderer is None:
+        await ctx.send(f"{ctx.author.mention} Error: bracket images need Pillow to be installed")
+        return
+
+    try:
+        image = await hosted.bracket_renderer.render(number)
+    except ValueError as e:
+        await ctx.send(f"{ctx.author.mention} Error: {str(e)}")
+        return
+
+    await ctx.send(file=discord.File(io.BytesIO(image), filename="bracket.png"))
+
+@bot.command()
+async def standings(ctx, limit: int = 20):
+    """Shows the standings of a swiss or round robin bracket. """
+    hosted = await get_hosted_tournament(ctx)
+    if hosted is None:
+        return
+
+    try:
+        ranked = hosted.tournament.get_standings()
+    except ValueError as e:
+        await ctx.send(f"{ctx.author.mention} Error: {str(e)}")
+        return
+
+    lines = [
+        f"{place}. {standing.team.name} {standing.points} pts "
+        f"({standing.wins}-{standing.losses}, buchholz {standing.buchholz}, "
+        f"games {standing.games_won}:{standing.games_lost})"
+        for place, standing in enumerate(ranked[:limit], 1)
+    ]
+    if not lines:
+        await ctx.send("No standings yet")
+        return
+    await send_lines(ctx, lines)
+
+def format_requests_stats(counter: str, histogram_name: str, label: str) -> list[str]:
+    """Returns a line per operation with its calls, failures and latency. """
+
+    totals = {}
+    for key, count in metrics.get_counters(counter).items():
+        labels = dict(key)
+        status = labels["status"]
+        calls, failures = totals.get(labels[label], (0, {}))
+        if status != "ok" and not (status.isdigit() and int(status) < 400):
+            failures[status] = failures.get(status, 0) + int(count)
+        totals[labels[label]] = (calls + int(count), failures)
+
+    histograms = {}
+    for key, histogram in metrics.get_histograms(histogram_name).items():
+        histograms[dict(key)[label]] = histogram
+
+    lines = []
+    for operation, (calls, failures) in sorted(totals.items()):
+        line = f"  {operation}: {calls} calls"
+        if failures:
+            line += " (" + ", ".join(f"{count}x {status}" for status, count in sorted(failures.items())) + ")"
+        histogram = histograms.get(operation)
+        if histogram is not None:
+            line += f", p50 {histogram.quantile(0.5):.2f}s, p95 {histogram.quantile(0.95):.2f}s"
+        lines.append(line)
+    return lines
+
+@bot.command()
+async def stats(ctx):
+    """Shows the requests to the osu! api and google sheets, their quotas, the commands and startup timing. """
+
+    budget = metrics.get_gauge("osu_api_budget_remaining").get((), 0)
+    quotas = {dict(key)["kind"]: value for key, value in metrics.get_gauge("sheets_quota_remaining").items()}
+    cache = user_cache.stats
+
+    lines = [f"osu! API (budget left: {budget:g} requests)"]
+    lines += format_requests_stats(
+        "osu_api_requests_total", "osu_api_request_duration_seconds", "operation"
+    ) or ["  no requests yet"]
+    lines.append(
+        f"Google Sheets (quota left: {quotas.get('read', 0):g} reads, {quotas.get('write', 0):g} writes this minute)"
+    )
+    lines += format_requests_stats(
+        "sheets_requests_total", "sheets_request_duration_seconds", "operation"
+    ) or ["  no requests yet"]
+    lines.append("Commands")
+    lines += format_requests_stats(
+        "commands_total", "command_duration_seconds", "command"
+    ) or ["  no commands yet"]
+    lines.append(
+        f"User cache: {cache['size']} profiles, {cache['hits']} hits, "
+        f"{cache['misses']} misses ({cache['hit_rate']:.0%} hit rate)"
+    )
+    lines.append(
+        "Startup: " + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in startup_times.items())
+    )
+    await send_lines(ctx, lines)
+
 bot.run(os.getenv("DISCORD_BOT_TOKEN"))
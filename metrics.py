@@ -0,0 +1,204 @@
+""" Implementing of in-process metrics with a Prometheus text format export. """
+
+import bisect
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Histogram:
+    """Represents a histogram of observed values with cumulative buckets. """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        """Adds the value to its bucket. """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Returns the quantile estimated by linear interpolation inside its bucket. """
+
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / count)
+            seen += count
+        return self.max
+
+class MetricsRegistry:
+    """
+    Represents a thread safe registry of counters, histograms and gauges.
+
+    Metrics are identified by a name and labels. Gauges are callbacks
+    evaluated when the metrics are read, e.g. the remaining request budget.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: dict[str, tuple[str, str]] = {}
+        self._counters: defaultdict[str, dict[tuple, float]] = defaultdict(dict)
+        self._histograms: defaultdict[str, dict[tuple, Histogram]] = defaultdict(dict)
+        self._gauges: dict[str, Callable[[], float|dict[tuple, float]]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Increases the counter. """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._help.setdefault(name, ("counter", ""))
+            counters = self._counters[name]
+            counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        """Adds the value to the histogram. """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._help.setdefault(name, ("histogram", ""))
+            histograms = self._histograms[name]
+            if key not in histograms:
+                histograms[key] = Histogram()
+            histograms[key].observe(value)
+
+    def register_gauge(self, name: str, callback: Callable[[], float|dict[tuple, float]], help_text: str = ""):
+        """
+        Registers a gauge, the callback returns its value
+        or a dict of values by labels tuple, e.g. {(("kind", "read"),): 57}.
+        A gauge with the same name is replaced.
+        """
+        with self._lock:
+            self._help[name] = ("gauge", help_text)
+            self._gauges[name] = callback
+
+    @contextmanager
+    def track(self, counter: str, histogram: str, **labels):
+        """
+        Measures the body as a call of the operation:
+        counts it with its status and observes its duration in the histogram.
+        The status is "ok", the error code or the error type name.
+        """
+
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except BaseException as e:
+            status = get_error_status(e)
+            raise
+        finally:
+            self.observe(histogram, time.perf_counter() - start, **labels)
+            self.inc(counter, status=status, **labels)
+
+    def get_counters(self, name: str) -> dict[tuple, float]:
+        """Returns the values of the counter by labels. """
+        with self._lock:
+            return dict(self._counters.get(name, {}))
+
+    def get_histograms(self, name: str) -> dict[tuple, Histogram]:
+        """Returns the histograms by labels. """
+        with self._lock:
+            return dict(self._histograms.get(name, {}))
+
+    def get_gauge(self, name: str) -> dict[tuple, float]:
+        """Returns the current values of the gauge by labels. """
+        callback = self._gauges.get(name)
+        if callback is None:
+            return {}
+        value = callback()
+        return value if isinstance(value, dict) else {(): value}
+
+    def render_prometheus(self) -> str:
+        """Returns the metrics in the Prometheus text exposition format. """
+
+        with self._lock:
+            help_texts = dict(self._help)
+            counters = {name: dict(values) for name, values in self._counters.items()}
+            histograms = {
+                name: {key: (h.buckets, list(h.counts), h.count, h.sum) for key, h in values.items()}
+                for name, values in self._histograms.items()
+            }
+            gauges = list(self._gauges)
+
+        lines = []
+
+        def header(name: str):
+            metric_type, help_text = help_texts.get(name, ("untyped", ""))
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+        for name in sorted(counters):
+            header(name)
+            for key, value in sorted(counters[name].items()):
+                lines.append(f"{name}{format_labels(key)} {value:g}")
+
+        for name in sorted(histograms):
+            header(name)
+            for key, (buckets, counts, count, total) in sorted(histograms[name].items()):
+                cumulative = 0
+                for bound, bucket_count in zip(buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f"{name}_bucket{format_labels(key + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(key)} {total:.6f}")
+                lines.append(f"{name}_count{format_labels(key)} {count}")
+
+        for name in sorted(gauges):
+            header(name)
+            for key, value in sorted(self.get_gauge(name).items()):
+                lines.append(f"{name}{format_labels(key)} {value:g}")
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """Atomically writes the metrics to the file, e.g. for the node exporter textfile collector. """
+
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            file.write(self.render_prometheus())
+        os.replace(temporary_path, path)
+
+def format_labels(key: tuple) -> str:
+    """Returns the labels in the Prometheus format, e.g. {operation="get",status="ok"}. """
+    if not key:
+        return ""
+
+    def escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    labels = ",".join(f'{label}="{escape(value)}"' for label, value in key)
+    return "{" + labels + "}"
+
+def get_error_status(error: BaseException) -> str:
+    """Returns the status code of the error if it has one, otherwise its type name. """
+
+    for attribute in ("status", "code"):
+        status = getattr(error, attribute, None)
+        if isinstance(status, int):
+            return str(status)
+
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    if isinstance(status, int):
+        return str(status)
+
+    return type(error).__name__
+
+# The registry shared by the clients, the sheets managers and the bot commands.
+registry = MetricsRegistry()
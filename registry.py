@@ -0,0 +1,243 @@
+""" Implementing of a registry of the tournaments hosted by the bot in many guilds. """
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable
+
+from bracket_renderer import BracketRenderer
+from dispatcher import CommandDispatcher
+from game_api_client import GameAPIClient
+from metrics import registry as metrics
+from scheduler import MatchPollingScheduler
+from sheets_manager import TournamentSheetsManager, sheets_manager_from_config
+from storage import SnapshotVersionError, TournamentStore, dump_tournament, load_tournament
+from tournament import OsuMatchManager, OsuTournamentManager, TournamentService
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOURNAMENT_ID = "main"
+
+@dataclass(eq=False)
+class HostedTournament:
+    """Represents a tournament hosted in a guild with its spreadsheet and matches polling. """
+
+    guild_id: int
+    tournament_id: str
+
+    sheets_manager: TournamentSheetsManager|None = None
+    tournament: TournamentService|None = None
+    scheduler: MatchPollingScheduler|None = field(default=None, repr=False)
+    announcements_channel_id: int|None = None
+    bracket_renderer: BracketRenderer|None = field(default=None, repr=False)
+    last_used: float = field(default_factory=time.monotonic, repr=False)
+
+    @property
+    def key(self) -> str:
+        """Key of the tournament in the store and of its commands lock. """
+        return get_key(self.guild_id, self.tournament_id)
+
+    def is_active(self) -> bool:
+        """Whether the tournament has linked matches which are being played. """
+        if self.tournament is None or self.tournament.get_tournament_manager().get_bracket_manager() is None:
+            return False
+        return any(
+            match.match_id is not None and match.status == "In Progress"
+            for match in self.tournament.get_matches()
+        )
+
+def get_key(guild_id: int, tournament_id: str) -> str:
+    """Returns the key of the tournament of the guild. """
+    return f"{guild_id}:{tournament_id}"
+
+class TournamentRegistry:
+    """
+    Represents a registry of the tournaments hosted by the bot, keyed by guild and tournament id.
+
+    Every tournament has its own services, sheets manager and polling scheduler.
+    Tournaments are loaded from the store on first use and kept in memory
+    in least recently used order: the ones idle for idle_timeout seconds
+    and, above max_loaded, the least recently used idle ones are evicted.
+    A tournament is idle when none of its commands is running and none of its matches is played.
+    The osu! api client is shared by all the tournaments.
+    on_service_created is called with every tournament and its newly created services,
+    e.g. to subscribe to the events of its bracket.
+    """
+
+    def __init__(
+        self,
+        store: TournamentStore,
+        dispatcher: CommandDispatcher,
+        game_api_client: GameAPIClient,
+        max_loaded: int = 64,
+        idle_timeout: float = 3600.0,
+        on_service_created: Callable[[HostedTournament, TournamentService], None]|None = None
+    ):
+        self._store = store
+        self._dispatcher = dispatcher
+        self._game_api_client = game_api_client
+        self._max_loaded = max_loaded
+        self._idle_timeout = idle_timeout
+        self._on_service_created = on_service_created
+
+        self._loaded: OrderedDict[str, HostedTournament] = OrderedDict()
+        self._loading: dict[str, asyncio.Task] = {}
+        self._selected: dict[int, str] = {}
+
+        metrics.register_gauge(
+            "hosted_tournaments_loaded", lambda: len(self._loaded), "Tournaments kept in memory."
+        )
+
+    async def select(self, guild_id: int, tournament_id: str):
+        """Makes the tournament the one the commands of the guild are applied to. """
+        await self._dispatcher.run_blocking(self._store.save_selection, guild_id, tournament_id)
+        self._selected[guild_id] = tournament_id
+
+    async def get_selected(self, guild_id: int) -> str:
+        """Returns the id of the tournament selected in the guild, the saved selection is read once. """
+
+        tournament_id = self._selected.get(guild_id)
+        if tournament_id is None:
+            tournament_id = await self._dispatcher.run_blocking(self._store.load_selection, guild_id)
+            tournament_id = self._selected.setdefault(guild_id, tournament_id or DEFAULT_TOURNAMENT_ID)
+        return tournament_id
+
+    async def get(self, guild_id: int, tournament_id: str) -> HostedTournament:
+        """Returns the tournament, loading it from the store or creating an empty one. """
+
+        key = get_key(guild_id, tournament_id)
+        hosted = self._loaded.get(key)
+
+        if hosted is None:
+            if key not in self._loading:
+                self._loading[key] = asyncio.create_task(self._load(guild_id, tournament_id))
+            try:
+                hosted = await asyncio.shield(self._loading[key])
+            finally:
+                self._loading.pop(key, None)
+
+            self._loaded[key] = hosted
+
+        self._loaded.move_to_end(key)
+        hosted.last_used = time.monotonic()
+        self._evict(keep=hosted)
+        return hosted
+
+    async def get_selected_tournament(self, guild_id: int) -> HostedTournament:
+        """Returns the tournament selected in the guild. """
+        return await self.get(guild_id, await self.get_selected(guild_id))
+
+    async def list_tournaments(self, guild_id: int) -> list[str]:
+        """Returns the ids of the saved and loaded tournaments of the guild. """
+
+        prefix = get_key(guild_id, "")
+        keys = set(await self._dispatcher.run_blocking(self._store.keys, prefix))
+        keys.update(key for key in self._loaded if key.startswith(prefix))
+        return sorted(key.removeprefix(prefix) for key in keys)
+
+    async def save(self, hosted: HostedTournament):
+        """Saves the snapshot of the tournament and its connected spreadsheet. """
+
+        state = {
+            "sheets": hosted.sheets_manager.get_config() if hosted.sheets_manager is not None else None,
+            "tournament": None,
+            "active": hosted.is_active(),
+            "announcements_channel_id": hosted.announcements_channel_id,
+        }
+        if hosted.tournament is not None:
+            state["tournament"] = dump_tournament(hosted.tournament.get_tournament_manager())
+
+        await self._dispatcher.run_blocking(self._store.save, hosted.key, state)
+
+    def create_tournament_service(self, hosted: HostedTournament) -> TournamentService:
+        """Creates the services of a new tournament using its connected spreadsheet. """
+        service = TournamentService(
+            hosted.sheets_manager,
+            OsuTournamentManager(self._game_api_client),
+            self._dispatcher.sheets_executor
+        )
+        if self._on_service_created is not None:
+            self._on_service_created(hosted, service)
+        return service
+
+    def start_scheduler(self, hosted: HostedTournament):
+        """(Re)starts polling the matches of the tournament in the background. """
+
+        self.stop_scheduler(hosted)
+
+        async def save():
+            await self.save(hosted)
+
+        hosted.scheduler = MatchPollingScheduler(
+            hosted.tournament, lock=self._dispatcher.get_lock(hosted.key), on_update=save
+        )
+        hosted.scheduler.start()
+
+    def stop_scheduler(self, hosted: HostedTournament):
+        """Stops polling the matches of the tournament, e.g. before its services are replaced. """
+        if hosted.scheduler is not None:
+            hosted.scheduler.stop()
+            hosted.scheduler = None
+
+    async def resume_active(self):
+        """Loads the tournaments whose matches were being played, so their polling goes on. """
+        for key in await self._dispatcher.run_blocking(self._store.active_keys):
+            guild_id, _, tournament_id = key.partition(":")
+            await self.get(int(guild_id), tournament_id)
+
+    def close(self):
+        """Stops polling the matches of all the loaded tournaments. """
+        for hosted in self._loaded.values():
+            if hosted.scheduler is not None:
+                hosted.scheduler.stop()
+
+    async def _load(self, guild_id: int, tournament_id: str) -> HostedTournament:
+        """Restores the tournament from the store without requesting the osu! and google APIs. """
+
+        hosted = HostedTournament(guild_id, tournament_id)
+        state = await self._dispatcher.run_blocking(self._store.load, hosted.key)
+        if state is None:
+            return hosted
+
+        hosted.announcements_channel_id = state.get("announcements_channel_id")
+
+        if state["sheets"] is not None:
+            hosted.sheets_manager = sheets_manager_from_config(state["sheets"])
+
+        if state["tournament"] is not None:
+            hosted.tournament = self.create_tournament_service(hosted)
+            try:
+                load_tournament(
+                    state["tournament"], hosted.tournament.get_tournament_manager(), OsuMatchManager()
+                )
+            except SnapshotVersionError as e:
+                # The tournament has to be created again, its spreadsheet is kept.
+                logger.error("Tournament %s can't be restored: %s", hosted.key, e)
+                hosted.tournament = None
+                return hosted
+
+            if hosted.tournament.get_tournament_manager().get_bracket_manager() is not None:
+                self.start_scheduler(hosted)
+
+        return hosted
+
+    def _evict(self, keep: HostedTournament):
+        """Evicts the idle tournaments which are unused for too long or above the limit. """
+
+        now = time.monotonic()
+        for key, hosted in list(self._loaded.items()):
+            over_limit = len(self._loaded) > self._max_loaded
+            expired = now - hosted.last_used > self._idle_timeout
+            if not over_limit and not expired:
+                # The rest are used more recently.
+                break
+
+            if hosted is keep or self._dispatcher.get_lock(key).locked() or hosted.is_active():
+                continue
+
+            if hosted.scheduler is not None:
+                hosted.scheduler.stop()
+            del self._loaded[key]
+            self._dispatcher.discard_lock(key)
@@ -0,0 +1,180 @@
+""" Implementing of a background scheduler polling the tournament matches in progress. """
+
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Awaitable, Callable
+
+from tournament import Match, MatchUpdateError, TournamentService
+
+logger = logging.getLogger(__name__)
+
+class MatchPollingScheduler:
+    """
+    Represents a background scheduler which polls the linked matches
+    with a per-match adaptive interval and coalesces bracket sheet updates.
+
+    A match is polled every min_interval seconds right after new games,
+    the interval grows by the backoff factor while nothing happens up to
+    max_interval, and the match is not polled anymore once it's completed.
+    A match which can't be polled backs off alone, the others are polled as usual.
+    A failed bracket sheet update is retried with the delay growing
+    by the backoff factor up to max_sync_delay.
+    Polls and syncs hold the lock, if it is given, to be serialized with the commands.
+    on_update is called after every poll which has changed the matches.
+    """
+
+    def __init__(
+        self,
+        tournament: TournamentService,
+        min_interval: float = 5.0,
+        max_interval: float = 60.0,
+        backoff: float = 1.5,
+        sync_delay: float = 5.0,
+        max_sync_delay: float = 600.0,
+        lock: asyncio.Lock|None = None,
+        on_update: Callable[[], Awaitable[None]]|None = None
+    ):
+        self._tournament = tournament
+        self._lock = lock if lock is not None else contextlib.nullcontext()
+        self._on_update = on_update
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._backoff = backoff
+        self._sync_delay = sync_delay
+        self._max_sync_delay = max_sync_delay
+
+        self._intervals: dict[int, float] = {}
+        self._due: dict[int, float] = {}
+        self._match_ids: dict[int, int] = {}
+
+        self._wake_event = asyncio.Event()
+        self._task: asyncio.Task|None = None
+        self._sync_task: asyncio.Task|None = None
+
+    @property
+    def running(self) -> bool:
+        """Whether the scheduler is running. """
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Starts polling in the background. """
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        """Stops polling. """
+        for task in (self._task, self._sync_task):
+            if task is not None:
+                task.cancel()
+        self._task = None
+        self._sync_task = None
+
+    def wake(self):
+        """Makes the scheduler look for newly linked matches right away. """
+        self._wake_event.set()
+
+    def request_sheet_sync(self):
+        """
+        Schedules a bracket sheet update after sync_delay,
+        the requests made before it happens are coalesced into it.
+        """
+        if self._sync_task is None or self._sync_task.done():
+            self._sync_task = asyncio.create_task(self._sync_sheet())
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            due_matches = [
+                match for match in self._get_polled_matches()
+                if self._due.setdefault(match.number, now) <= now
+            ]
+
+            if due_matches:
+                await self._poll(due_matches)
+
+            self._wake_event.clear()
+            timeout = self._max_interval
+            if self._due:
+                timeout = max(0.0, min(self._due.values()) - time.monotonic())
+
+            try:
+                await asyncio.wait_for(self._wake_event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _get_polled_matches(self) -> list[Match]:
+        """Returns the linked matches which are not completed yet. """
+
+        matches = []
+        for match in self._tournament.get_matches():
+            if match.match_id is None or match.status == "Completed":
+                self._forget(match)
+                continue
+            if self._match_ids.get(match.number) != match.match_id:
+                self._forget(match)
+                self._match_ids[match.number] = match.match_id
+            matches.append(match)
+        return matches
+
+    async def _poll(self, matches: list[Match]):
+        """Polls the matches and reschedules them depending on whether something happened. """
+
+        before = {match.number: (len(match.games), match.status) for match in matches}
+
+        try:
+            async with self._lock:
+                await self._tournament.update_matches(matches)
+        except MatchUpdateError as e:
+            for number, (match_id, error) in e.errors.items():
+                logger.warning("Failed to poll match #%s (game match %s): %s", number, match_id, error)
+        except Exception: # pylint: disable=broad-exception-caught
+            logger.exception("Failed to poll matches %s", list(before))
+
+        changed = False
+        now = time.monotonic()
+
+        for match in matches:
+            if (len(match.games), match.status) != before[match.number]:
+                changed = True
+                interval = self._min_interval
+            else:
+                interval = min(
+                    self._max_interval,
+                    self._intervals.get(match.number, self._min_interval) * self._backoff
+                )
+
+            if match.status == "Completed":
+                self._forget(match)
+                continue
+
+            self._intervals[match.number] = interval
+            self._due[match.number] = now + interval
+
+        if changed:
+            self.request_sheet_sync()
+            if self._on_update is not None:
+                await self._on_update()
+
+    def _forget(self, match: Match):
+        """Drops the polling schedule of the match. """
+        self._intervals.pop(match.number, None)
+        self._due.pop(match.number, None)
+        self._match_ids.pop(match.number, None)
+
+    async def _sync_sheet(self, delay: float|None = None):
+        if delay is None:
+            delay = self._sync_delay
+        await asyncio.sleep(delay)
+
+        try:
+            async with self._lock:
+                await self._tournament.update_bracket_sheet()
+        except Exception as e: # pylint: disable=broad-exception-caught
+            retry_delay = min(self._max_sync_delay, delay * self._backoff)
+            if delay == self._sync_delay:
+                logger.exception("Failed to update the bracket sheet, retrying in %.0fs", retry_delay)
+            else:
+                logger.warning("Failed to update the bracket sheet again, retrying in %.0fs: %s", retry_delay, e)
+            self._sync_task = asyncio.create_task(self._sync_sheet(retry_delay))
@@ -2,15 +2,177 @@
 
 from abc import ABC, abstractmethod
 
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+import csv
+import heapq
+import itertools
+import json
+import logging
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+from typing import Iterable
+
+from metrics import get_error_status, registry
+
+logger = logging.getLogger(__name__)
+
+# Priorities of the sheets requests, the lower goes first.
+PRIORITY_RESULTS = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_COSMETIC = 2
+
+def is_api_error(error: BaseException) -> bool:
+    """
+    Whether the error is a google sheets api error.
+    gspread is imported only when a spreadsheet is opened, before that no such error can happen.
+    """
+    exceptions = sys.modules.get("gspread.exceptions")
+    return exceptions is not None and isinstance(error, exceptions.APIError)
+
+def a1_to_rowcol(label: str) -> tuple[int, int]:
+    """Returns (row, col) of the cell in A1 notation, e.g. "B3" ---> (3, 2). """
+
+    match = re.fullmatch(r"([A-Za-z]+)([0-9]+)", label)
+    if match is None:
+        raise ValueError(f"wrong cell label {label}")
+
+    col = 0
+    for letter in match.group(1).upper():
+        col = col * 26 + ord(letter) - ord("A") + 1
+    return int(match.group(2)), col
+
+def rowcol_to_a1(row: int, col: int) -> str:
+    """Returns the cell in A1 notation, e.g. (3, 2) ---> "B3". """
+
+    letters = ""
+    while col > 0:
+        col, remainder = divmod(col - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return f"{letters}{row}"
+
+class SheetsRequestScheduler:
+    """
+    Represents a scheduler of google sheets requests within the per-minute
+    read and write quotas.
+
+    Every kind of requests has a token bucket, the requests waiting
+    for a token are queued by priority and then by arrival, so bursts
+    are smoothed out instead of being rejected. Quota and server errors
+    are retried with jittered exponential backoff, a quota error also
+    pauses the other requests of its kind.
+    """
+
+    RETRY_STATUSES = ("429", "500", "502", "503")
+    MAX_RETRIES = 5
+    BACKOFF_BASE = 1.0
+    BACKOFF_MAX = 64.0
+
+    def __init__(self, reads_per_minute: int = 60, writes_per_minute: int = 60, burst: int = 10):
+        self._condition = threading.Condition()
+        self._sequence = itertools.count()
+
+        now = time.monotonic()
+        self._rates = {"read": reads_per_minute / 60, "write": writes_per_minute / 60}
+        self._capacity = burst
+        self._tokens = {kind: float(burst) for kind in self._rates}
+        self._updated_at = {kind: now for kind in self._rates}
+        self._paused_until = {kind: 0.0 for kind in self._rates}
+        self._waiting: dict[str, list[tuple[int, int]]] = {kind: [] for kind in self._rates}
+
+    def remaining(self, kind: str) -> int:
+        """Estimated amount of requests of the kind that can be sent right now. """
+        with self._condition:
+            self._refill(kind, time.monotonic())
+            return int(self._tokens[kind])
+
+    def execute(self, kind: str, priority: int, func, *args, **kwargs):
+        """
+        Calls func when a request of the kind ("read" or "write") can be sent,
+        retrying it on quota and server errors.
+
+        Raises:
+            APIError: if the error can't be retried or the retries are exhausted.
+        """
+
+        for attempt in range(self.MAX_RETRIES + 1):
+            self._acquire(kind, priority)
+            try:
+                return func(*args, **kwargs)
+            except Exception as e: # pylint: disable=broad-exception-caught
+                if not is_api_error(e):
+                    raise
+
+                status = get_error_status(e)
+                if status not in self.RETRY_STATUSES or attempt == self.MAX_RETRIES:
+                    raise
+
+                delay = min(self.BACKOFF_MAX, self.BACKOFF_BASE * 2 ** attempt + random.uniform(0, 1))
+                registry.inc("sheets_retries_total", kind=kind, status=status)
+                logger.warning("Sheets %s request failed with %s, retrying in %.1fs", kind, status, delay)
+
+                if status == "429":
+                    self._pause(kind, delay)
+                else:
+                    time.sleep(delay)
+
+    def _acquire(self, kind: str, priority: int):
+        """Waits for the turn of the request and takes a token of its kind. """
+
+        ticket = (priority, next(self._sequence))
+        waiting = self._waiting[kind]
+        start = time.perf_counter()
+
+        with self._condition:
+            heapq.heappush(waiting, ticket)
+            try:
+                while True:
+                    timeout = None
+                    if waiting[0] == ticket:
+                        timeout = self._get_wait(kind)
+                        if timeout <= 0:
+                            self._tokens[kind] -= 1
+                            return
+                    self._condition.wait(timeout)
+            finally:
+                waiting.remove(ticket)
+                heapq.heapify(waiting)
+                self._condition.notify_all()
+                registry.observe("sheets_quota_wait_seconds", time.perf_counter() - start, kind=kind)
+
+    def _get_wait(self, kind: str) -> float:
+        """Returns how long to wait for a token of the kind. """
+
+        now = time.monotonic()
+        if now < self._paused_until[kind]:
+            return self._paused_until[kind] - now
+
+        self._refill(kind, now)
+        if self._tokens[kind] >= 1:
+            return 0.0
+        return (1 - self._tokens[kind]) / self._rates[kind]
+
+    def _pause(self, kind: str, seconds: float):
+        """Stops giving out tokens of the kind for the given time. """
+        with self._condition:
+            self._paused_until[kind] = max(self._paused_until[kind], time.monotonic() + seconds)
+            self._tokens[kind] = 0
+            self._condition.notify_all()
+
+    def _refill(self, kind: str, now: float):
+        self._tokens[kind] = min(
+            self._capacity, self._tokens[kind] + (now - self._updated_at[kind]) * self._rates[kind]
+        )
+        self._updated_at[kind] = now
 
 class TournamentSheetsManager(ABC):
     """Represents a manager of sheets related with tournament. """
 
     @abstractmethod
-    def get_signups(self) -> list[list]:
-        """Gets the signups list. """
+    def get_signups(self, start: int = 0) -> list[list]:
+        """Gets the signups list without the first start signups. """
 
     # TODO: Change list[list] to list[dict]
     @abstractmethod
@@ -18,11 +180,38 @@ class TournamentSheetsManager(ABC):
         """Updates teams sheet. """
 
     @abstractmethod
-    def update_bracket_sheet(self, matches_info: list[dict]):
-        """Updates bracket sheet. """
+    def update_bracket_sheet(self, matches_info: list[dict], changed: list[int]|None = None):
+        """
+        Updates bracket sheet.
+        Only the matches at the changed indexes may differ from the previous update,
+        all the matches are compared if it is None.
+        """
+
+    @abstractmethod
+    def get_config(self) -> dict:
+        """Returns the config the manager can be recreated with by sheets_manager_from_config(). """
 
 class OsuTournamentSheetsManager(TournamentSheetsManager):
-    """Represents a manager of sheets related with osu tournament. """
+    """
+    Represents a manager of sheets related with osu tournament.
+
+    The manager keeps a shadow copy of what it has written to the teams
+    and bracket sheets, so the changes are computed locally without reading
+    the sheets back. Bracket changes are written behind: they are collected
+    and flushed together flush_delay seconds after the last update,
+    but no later than max_flush_delay seconds after the first one.
+
+    Every request goes through the request scheduler, which is shared
+    between all the managers unless another one is given. Results are
+    written ahead of the avatars, which wait while the write quota is short.
+    """
+
+    BACKEND = "google_sheets"
+
+    # Write tokens kept for the results before the avatars are written.
+    COSMETIC_WRITES_RESERVE = 2
+
+    _shared_scheduler: SheetsRequestScheduler|None = None
 
     def __init__(
         self,
@@ -30,16 +219,84 @@ class OsuTournamentSheetsManager(TournamentSheetsManager):
         signups_sheet_id: int,
         teams_sheet_id:int,
         bracket_sheet_id:int,
+        flush_delay: float = 0.0,
+        max_flush_delay: float = 10.0,
+        request_scheduler: SheetsRequestScheduler|None = None
     ):
+        if request_scheduler is None:
+            if OsuTournamentSheetsManager._shared_scheduler is None:
+                OsuTournamentSheetsManager._shared_scheduler = SheetsRequestScheduler()
+            request_scheduler = OsuTournamentSheetsManager._shared_scheduler
+        self._request_scheduler = request_scheduler
+        registry.register_gauge(
+            "sheets_quota_remaining",
+            lambda: {(("kind", kind),): request_scheduler.remaining(kind) for kind in ("read", "write")},
+            "Estimated Google Sheets requests that can be sent right now."
+        )
+
         self._teams_start_cell = "A1"
         self._bracket_start_cell = "C3"
 
-        self._gspread_client = self._gspread_authorize("key.json")
+        self._flush_delay = flush_delay
+        self._max_flush_delay = max_flush_delay
+        self._flush_lock = threading.RLock()
+        self._flush_timer: threading.Timer|None = None
+        self._first_pending_at: float|None = None
+
+        # What has been written to the sheets, the bracket shadow is filled
+        # by a single read of the bracket range on the first update.
+        self._teams_shadow: list[list]|None = None
+        self._bracket_shadow: dict[tuple[int, int], str]|None = None
+        self._pending_bracket_cells: dict[tuple[int, int], str] = {}
+        self._bracket_layout: tuple[tuple[str, int], list[tuple[int, int]]]|None = None
+
+        self._spreadsheet_id = spreadsheet_id
+        self._signups_sheet_id = signups_sheet_id
+        self._teams_sheet_id = teams_sheet_id
+        self._bracket_sheet_id = bracket_sheet_id
 
-        self._spreadsheet = self._gspread_client.open_by_key(spreadsheet_id)
-        self._signups_sheet = self._spreadsheet.get_worksheet_by_id(signups_sheet_id)
-        self._teams_sheet = self._spreadsheet.get_worksheet_by_id(teams_sheet_id)
-        self._bracket_sheet = self._spreadsheet.get_worksheet_by_id(bracket_sheet_id)
+        # The spreadsheet and worksheets are opened on first use.
+        self._spreadsheet = None
+        self._worksheets = {}
+
+    @property
+    def _signups_sheet(self):
+        return self._get_worksheet(self._signups_sheet_id)
+
+    @property
+    def _teams_sheet(self):
+        return self._get_worksheet(self._teams_sheet_id)
+
+    @property
+    def _bracket_sheet(self):
+        return self._get_worksheet(self._bracket_sheet_id)
+
+    def get_config(self) -> dict:
+        """Returns the arguments and start cells the manager can be recreated with. """
+        return {
+            "backend": self.BACKEND,
+            "spreadsheet_id": self._spreadsheet_id,
+            "signups_sheet_id": self._signups_sheet_id,
+            "teams_sheet_id": self._teams_sheet_id,
+            "bracket_sheet_id": self._bracket_sheet_id,
+            "teams_start_cell": self._teams_start_cell,
+            "bracket_start_cell": self._bracket_start_cell,
+            "flush_delay": self._flush_delay,
+        }
+
+    @classmethod
+    def from_config(cls, config: dict) -> "OsuTournamentSheetsManager":
+        """Creates a manager from the get_config() result. """
+        sheets_manager = cls(
+            config["spreadsheet_id"],
+            config["signups_sheet_id"],
+            config["teams_sheet_id"],
+            config["bracket_sheet_id"],
+            flush_delay=config.get("flush_delay", 0.0),
+        )
+        sheets_manager.set_teams_start_cell(config["teams_start_cell"])
+        sheets_manager.set_bracket_start_cell(config["bracket_start_cell"])
+        return sheets_manager
 
     def set_teams_start_cell(self, cell: str):
         """
@@ -47,6 +304,7 @@ class OsuTournamentSheetsManager(TournamentSheetsManager):
         to determine where to enter the data.
         """
         self._teams_start_cell = cell
+        self.reset_shadow()
 
     def set_bracket_start_cell(self, cell: str):
         """
@@ -54,10 +312,24 @@ class OsuTournamentSheetsManager(TournamentSheetsManager):
         to determine where to enter the data.
         """
         self._bracket_start_cell = cell
+        self.reset_shadow()
 
-    def get_signups(self) -> list[list]:
+    def reset_shadow(self):
+        """
+        Forgets what has been written to the sheets,
+        e.g. after they have been edited by hand.
+        """
+        with self._flush_lock:
+            self._teams_shadow = None
+            self._bracket_shadow = None
+
+    def get_signups(self, start: int = 0) -> list[list]:
         """
         Returns the signups list.
+        Only the rows after the first start signups are read.
+
+        Args:
+            start (int): amount of signups to skip.
 
         Returns:
             list[list]: signups list 
@@ -67,74 +339,249 @@ class OsuTournamentSheetsManager(TournamentSheetsManager):
                     ...
                 ]
         """
-        signups = self._signups_sheet.get_all_values()
-        return signups[1:]
 
-    def update_bracket_sheet(self, matches_info: list[dict]):
-        """ Updates an information about matches in bracket sheet of main spreadsheet. """
+        # The first row is a header.
+        first_row = start + 2
+        signups_sheet = self._signups_sheet
+        if first_row > signups_sheet.row_count:
+            # Google rejects ranges outside of the grid, and the grid of a form responses sheet
+            # grows with the responses, so the size known since the sheet was opened is refreshed.
+            signups_sheet = self._reopen_worksheet(self._signups_sheet_id)
+            if first_row > signups_sheet.row_count:
+                return []
 
-        col = int(chr(int(ord(self._bracket_start_cell[0])) - 16))
-        start_row = int(self._bracket_start_cell[1])
-        match_index = 0
-        stage_number = 1
-        stage_step = 11
-        match_step = 4
+        last_col = rowcol_to_a1(1, signups_sheet.col_count).rstrip("0123456789")
+        signups = self._call(
+            "read", "get_signups", signups_sheet.get, f"A{first_row}:{last_col}"
+        )
+
+        width = max((len(signup) for signup in signups), default=0)
+        return [signup + [""] * (width - len(signup)) for signup in signups]
 
-        while match_index < len(matches_info):
-            for row in range(start_row, (len(matches_info) + 1) * 2, match_step):
-                match_info = matches_info[match_index]
-                match_index += 1
+    def update_bracket_sheet(self, matches_info: list[dict], changed: list[int]|None = None):
+        """
+        Updates an information about matches in bracket sheet of main spreadsheet.
+
+        The target cells of the changed matches are built in memory and compared
+        with the shadow copy of the sheet, the changed cells are written with
+        a single batch update right away or on the next flush if flush_delay is set.
+        All the matches are compared when the shadow copy has been reset.
+        """
 
-                if match_info["status"] == "Scheduled":
+        positions = self._get_bracket_layout(len(matches_info))
+        if not positions:
+            return
+
+        with self._flush_lock:
+            if self._bracket_shadow is None:
+                self._bracket_shadow = self._read_bracket_range(positions)
+                changed = None
+
+            if changed is None:
+                changed = range(len(positions))
+
+            def read_cell(row: int, col: int) -> str:
+                cell = (row, col)
+                if cell in self._pending_bracket_cells:
+                    return self._pending_bracket_cells[cell]
+                return self._bracket_shadow.get(cell, "")
+
+            for index in changed:
+                if index >= len(positions):
                     continue
+                row, col = positions[index]
+                for cell, value in self._get_match_cells(matches_info[index], row, col, read_cell):
+                    if read_cell(*cell) != value:
+                        self._pending_bracket_cells[cell] = value
+
+            if self._pending_bracket_cells:
+                self._schedule_flush()
 
-                if match_info["status"] in ["Completed", "In Progress"]:
-                    score_on_sheet = self._bracket_sheet.cell(row + 1, col + 4).value
-                    current_score = match_info["score"]
-                    if score_on_sheet != current_score:
-                        self._bracket_sheet.update_cell(row + 1, col + 4, current_score)
+    def flush(self):
+        """
+        Writes the pending bracket changes with a single batch update.
+        While the write quota is short only the results are written
+        and the avatars stay pending, so they don't hold back the results.
+        """
+
+        with self._flush_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            self._first_pending_at = None
+
+            shadow = self._bracket_shadow if self._bracket_shadow is not None else {}
+            changes = {
+                cell: value
+                for cell, value in self._pending_bracket_cells.items()
+                if shadow.get(cell, "") != value
+            }
+            self._pending_bracket_cells.clear()
+
+            if not changes:
+                return
+
+            avatar_changes = {
+                cell: value for cell, value in changes.items() if value.startswith("=IMAGE(")
+            }
+            result_changes = {
+                cell: value for cell, value in changes.items() if cell not in avatar_changes
+            }
+
+            if avatar_changes and result_changes:
+                if self._request_scheduler.remaining("write") > self.COSMETIC_WRITES_RESERVE:
+                    # The quota is enough, so everything is written with one request.
+                    result_changes = changes.copy()
+                else:
+                    self._pending_bracket_cells.update(avatar_changes)
+                    self._start_flush_timer(max(self._flush_delay, 1.0))
+                avatar_changes = {}
+
+            for priority, batch in ((PRIORITY_RESULTS, result_changes), (PRIORITY_COSMETIC, avatar_changes)):
+                if not batch:
                     continue
 
-                if match_info["team1"] is not None:
-                    avatar = self._bracket_sheet.cell(
-                        row, col, value_render_option="FORMULA"
-                    ).value
+                try:
+                    self._call(
+                        "write", "update_bracket_sheet",
+                        self._bracket_sheet.batch_update,
+                        [
+                            {"range": rowcol_to_a1(*cell), "values": [[value]]}
+                            for cell, value in batch.items()
+                        ],
+                        priority=priority,
+                        value_input_option="USER_ENTERED"
+                    )
+                except Exception:
+                    # Keeping the unwritten changes for the next flush.
+                    self._pending_bracket_cells = changes | self._pending_bracket_cells
+                    raise
 
-                    if not avatar:
-                        image = f'=IMAGE("{match_info["team1"]["avatar_url"]}")'
-                        country_emoji = match_info["team1"]["country_emoji"]
-                        name = match_info["team1"]["name"]
+                for cell in batch:
+                    del changes[cell]
+                if self._bracket_shadow is not None:
+                    self._bracket_shadow.update(batch)
 
-                        self._bracket_sheet.update_cell(row, col, image)
-                        self._bracket_sheet.update_cell(row + 1, col + 2, country_emoji)
-                        self._bracket_sheet.update_cell(row + 1, col + 3, name)
+    def _schedule_flush(self):
+        """Flushes now or (re)starts the debounce timer. """
 
-                if match_info["team2"] is not None:
-                    avatar = self._bracket_sheet.cell(
-                        row, col + 7, value_render_option="FORMULA"
-                    ).value
+        now = time.monotonic()
+        if self._first_pending_at is None:
+            self._first_pending_at = now
 
-                    if not avatar:
-                        image = f'=IMAGE("{match_info["team2"]["avatar_url"]}")'
-                        country_emoji = match_info["team2"]["country_emoji"]
-                        name = match_info["team2"]["name"]
+        delay = min(self._flush_delay, self._first_pending_at + self._max_flush_delay - now)
+        if delay <= 0:
+            self.flush()
+            return
 
-                        self._bracket_sheet.update_cell(row + 1, col + 5, name)
-                        self._bracket_sheet.update_cell(row + 1, col + 6, country_emoji)
-                        self._bracket_sheet.update_cell(row, col + 7, image)
+        self._start_flush_timer(delay)
+
+    def _start_flush_timer(self, delay: float):
+        """(Re)starts the timer flushing the pending changes in the background. """
+
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+        self._flush_timer = threading.Timer(delay, self._flush_in_background)
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        except Exception: # pylint: disable=broad-exception-caught
+            logger.exception("Failed to flush the bracket sheet, retrying later")
+            with self._flush_lock:
+                if self._pending_bracket_cells and self._flush_timer is None:
+                    self._start_flush_timer(max(self._flush_delay, 1.0))
+
+    def _read_bracket_range(self, positions: list[tuple[int, int]]) -> dict[tuple[int, int], str]:
+        """Reads the whole bracket range with a single request. """
+
+        top = min(row for row, _ in positions)
+        left = min(col for _, col in positions)
+        bottom = max(row for row, _ in positions) + 1
+        right = max(col for _, col in positions) + 7
+
+        grid = self._call(
+            "read", "read_bracket_range",
+            self._bracket_sheet.get,
+            f"{rowcol_to_a1(top, left)}:{rowcol_to_a1(bottom, right)}",
+            value_render_option="FORMULA"
+        )
+
+        return {
+            (top + row, left + col): str(value)
+            for row, values in enumerate(grid)
+            for col, value in enumerate(values)
+            if value != ""
+        }
+
+    def _get_bracket_layout(self, matches_amount: int) -> list[tuple[int, int]]:
+        """
+        Returns the (row, col) of the top-left cell of every match
+        in the bracket sheet, in the order of matches.
+        The layout is kept until the bracket size or start cell changes.
+        """
 
-                self._bracket_sheet.update_cell(row + 1, col + 4, "VS")
+        key = (self._bracket_start_cell, matches_amount)
+        if self._bracket_layout is not None and self._bracket_layout[0] == key:
+            return self._bracket_layout[1]
+
+        start_row, col = a1_to_rowcol(self._bracket_start_cell)
+        positions = []
+        stage_number = 1
+        stage_step = 11
+        match_step = 4
+
+        while len(positions) < matches_amount:
+            rows = range(start_row, (matches_amount + 1) * 2, match_step)
+            if not rows:
+                break
+
+            for row in rows[:matches_amount - len(positions)]:
+                positions.append((row, col))
 
             match_step *= 2
             start_row += 2 ** stage_number
             col += stage_step
             stage_number += 1
 
+        self._bracket_layout = (key, positions)
+        return positions
+
+    def _get_match_cells(self, match_info: dict, row: int, col: int, read_cell):
+        """
+        Yields ((row, col), value) of every cell of the match that should be on the sheet.
+        Team cells are filled only if there is no avatar yet.
+        """
+
+        if match_info["status"] == "Scheduled":
+            return
+
+        team_cells = (
+            ("team1", col, col + 2, col + 3),
+            ("team2", col + 7, col + 6, col + 5),
+        )
+
+        for team_key, avatar_col, emoji_col, name_col in team_cells:
+            team = match_info[team_key]
+            if team is None or read_cell(row, avatar_col):
+                continue
+
+            yield (row, avatar_col), f'=IMAGE("{team["avatar_url"]}")'
+            yield (row + 1, emoji_col), team["country_emoji"]
+            yield (row + 1, name_col), team["name"]
+
+        if match_info["status"] in ["Completed", "In Progress"]:
+            yield (row + 1, col + 4), match_info["score"]
+        else:
+            yield (row + 1, col + 4), "VS"
+
     # TODO Change list[list] to list[dict] and implement updating with list[dict].
-    # TODO: Implement updating the teams sheet with using start cell.
     def update_teams_sheet(self, teams: list[list]):
         """
-        Updates the teams sheet.
+        Updates the teams sheet starting from the teams start cell.
+        Only the new and changed rows are written, with a single batch update.
 
         Args:
             teams (list[list]): information about teams
@@ -160,11 +607,367 @@ class OsuTournamentSheetsManager(TournamentSheetsManager):
                         ...
                     ]
         """
-        self._teams_sheet.clear()
-        self._teams_sheet.append_rows(teams, value_input_option="USER_ENTERED")
+
+        rows = [[str(value) for value in team] for team in teams]
+        start_row, start_col = a1_to_rowcol(self._teams_start_cell)
+
+        with self._flush_lock:
+            if self._teams_shadow is None:
+                width = max((len(row) for row in rows), default=1)
+                self._teams_shadow = self._read_teams_range(start_row, start_col, width)
+
+            shadow = self._teams_shadow
+            rows += [[] for _ in range(len(shadow) - len(rows))]
+
+            changes = []
+            for index, row in enumerate(rows):
+                old_row = shadow[index] if index < len(shadow) else []
+                if row == old_row:
+                    continue
+
+                # Blanking the cells left from a longer row.
+                values = row + [""] * (len(old_row) - len(row))
+                if not values:
+                    continue
+
+                changes.append({
+                    "range": (
+                        f"{rowcol_to_a1(start_row + index, start_col)}:"
+                        f"{rowcol_to_a1(start_row + index, start_col + len(values) - 1)}"
+                    ),
+                    "values": [values]
+                })
+
+            if changes:
+                self._call(
+                    "write", "update_teams_sheet",
+                    self._teams_sheet.batch_update, changes, value_input_option="USER_ENTERED"
+                )
+
+            while rows and not rows[-1]:
+                rows.pop()
+            self._teams_shadow = rows
+
+    def _read_teams_range(self, start_row: int, start_col: int, width: int) -> list[list[str]]:
+        """Reads the teams range from the start cell to the last filled row. """
+
+        last_col = rowcol_to_a1(1, start_col + width - 1).rstrip("0123456789")
+        grid = self._call(
+            "read", "read_teams_range",
+            self._teams_sheet.get,
+            f"{rowcol_to_a1(start_row, start_col)}:{last_col}",
+            value_render_option="FORMULA"
+        )
+
+        rows = [[str(value) for value in row] for row in grid]
+        for row in rows:
+            while row and row[-1] == "":
+                row.pop()
+        return rows
+
+    def _get_worksheet(self, sheet_id: int):
+        """Returns the worksheet, authorizing and opening the spreadsheet on first use. """
+
+        if sheet_id not in self._worksheets:
+            if self._spreadsheet is None:
+                gspread_client = self._gspread_authorize("key.json")
+                self._spreadsheet = self._call(
+                    "read", "open_spreadsheet", gspread_client.open_by_key, self._spreadsheet_id
+                )
+            self._worksheets[sheet_id] = self._call(
+                "read", "get_worksheet", self._spreadsheet.get_worksheet_by_id, sheet_id
+            )
+        return self._worksheets[sheet_id]
+
+    def _reopen_worksheet(self, sheet_id: int):
+        """Returns the worksheet opened again, e.g. to get its current size. """
+        self._worksheets.pop(sheet_id, None)
+        return self._get_worksheet(sheet_id)
+
+    def _call(self, kind: str, operation: str, func, *args, priority: int = PRIORITY_DEFAULT, **kwargs):
+        """
+        Calls the google sheets api through the request scheduler
+        within the quota of its kind ("read" or "write"),
+        every attempt is measured in the metrics.
+        """
+
+        def request():
+            with registry.track(
+                "sheets_requests_total", "sheets_request_duration_seconds", kind=kind, operation=operation
+            ):
+                return func(*args, **kwargs)
+
+        return self._request_scheduler.execute(kind, priority, request)
 
     def _gspread_authorize(self, key_path: str):
-        """ Authorizes a gspread client. """
+        """ Authorizes a gspread client, gspread and oauth2client are imported on first use. """
+        # pylint: disable=import-outside-toplevel
+        import gspread
+        from oauth2client.service_account import ServiceAccountCredentials
+
         scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
         creds = ServiceAccountCredentials.from_json_keyfile_name(key_path, scope)
         return gspread.authorize(creds)
+
+class SQLiteTournamentSheetsManager(TournamentSheetsManager):
+    """
+    Represents a manager keeping the signups, teams and bracket of a tournament
+    in a local SQLite database instead of google sheets, e.g. for rehearsals and offline use.
+
+    Tournaments are told apart by spreadsheet_id, so a database holds many of them,
+    and a connection is shared by all the managers of a database.
+    Only the changed teams and matches are written. Signups are added
+    in bulk, e.g. imported from the csv export of the signups form.
+
+    The teams and bracket can be mirrored to another sheets manager, e.g. google sheets.
+    The local database stays the source of truth: mirroring errors are logged
+    and the mirror is compared in full on the next update.
+    """
+
+    BACKEND = "sqlite"
+
+    BRACKET_COLUMNS = (
+        "status", "score",
+        "team1_name", "team1_avatar_url", "team1_country_emoji",
+        "team2_name", "team2_avatar_url", "team2_country_emoji",
+    )
+
+    _shared_databases: dict[str, tuple[sqlite3.Connection, threading.Lock]] = {}
+    _shared_databases_lock = threading.Lock()
+
+    def __init__(self, path: str, spreadsheet_id: str, mirror: TournamentSheetsManager|None = None):
+        self._path = path
+        self._spreadsheet_id = spreadsheet_id
+        self._mirror = mirror
+        self._connection, self._lock = self._get_database(path)
+
+    @classmethod
+    def _get_database(cls, path: str) -> tuple[sqlite3.Connection, threading.Lock]:
+        """Returns the shared connection to the database, creating its tables on first use. """
+
+        with cls._shared_databases_lock:
+            if path not in cls._shared_databases:
+                connection = sqlite3.connect(path, check_same_thread=False)
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("PRAGMA synchronous=NORMAL")
+                with connection:
+                    connection.executescript(
+                        """
+                        CREATE TABLE IF NOT EXISTS signups (
+                            spreadsheet_id TEXT NOT NULL,
+                            position INTEGER NOT NULL,
+                            row TEXT NOT NULL,
+                            PRIMARY KEY (spreadsheet_id, position)
+                        ) WITHOUT ROWID;
+
+                        CREATE TABLE IF NOT EXISTS teams (
+                            spreadsheet_id TEXT NOT NULL,
+                            position INTEGER NOT NULL,
+                            row TEXT NOT NULL,
+                            PRIMARY KEY (spreadsheet_id, position)
+                        ) WITHOUT ROWID;
+
+                        CREATE TABLE IF NOT EXISTS bracket (
+                            spreadsheet_id TEXT NOT NULL,
+                            number INTEGER NOT NULL,
+                            status TEXT NOT NULL,
+                            score TEXT NOT NULL,
+                            team1_name TEXT,
+                            team1_avatar_url TEXT,
+                            team1_country_emoji TEXT,
+                            team2_name TEXT,
+                            team2_avatar_url TEXT,
+                            team2_country_emoji TEXT,
+                            PRIMARY KEY (spreadsheet_id, number)
+                        ) WITHOUT ROWID;
+
+                        CREATE INDEX IF NOT EXISTS bracket_status ON bracket (spreadsheet_id, status);
+                        """
+                    )
+                cls._shared_databases[path] = (connection, threading.Lock())
+            return cls._shared_databases[path]
+
+    def get_config(self) -> dict:
+        """Returns the arguments the manager can be recreated with, including the mirror's config. """
+        return {
+            "backend": self.BACKEND,
+            "path": self._path,
+            "spreadsheet_id": self._spreadsheet_id,
+            "mirror": self._mirror.get_config() if self._mirror is not None else None,
+        }
+
+    @classmethod
+    def from_config(cls, config: dict) -> "SQLiteTournamentSheetsManager":
+        """Creates a manager from the get_config() result. """
+        mirror = None
+        if config.get("mirror") is not None:
+            mirror = sheets_manager_from_config(config["mirror"])
+        return cls(config["path"], config["spreadsheet_id"], mirror)
+
+    def get_mirror(self) -> TournamentSheetsManager|None:
+        """Mirror getter. """
+        return self._mirror
+
+    def add_signups(self, signups: Iterable[list]) -> int:
+        """Appends the signups after the existing ones in one transaction and returns their amount. """
+
+        with self._lock, self._connection:
+            last_position = self._connection.execute(
+                "SELECT MAX(position) FROM signups WHERE spreadsheet_id = ?", (self._spreadsheet_id,)
+            ).fetchone()[0]
+            first_position = 0 if last_position is None else last_position + 1
+
+            cursor = self._connection.executemany(
+                "INSERT INTO signups (spreadsheet_id, position, row) VALUES (?, ?, ?)",
+                (
+                    (self._spreadsheet_id, position, json.dumps([str(value) for value in signup]))
+                    for position, signup in enumerate(signups, first_position)
+                )
+            )
+            return cursor.rowcount
+
+    def import_signups_csv(self, file: Iterable[str], has_header: bool = True) -> int:
+        """
+        Appends the signups of the csv file, e.g. the responses of the signups form,
+        and returns their amount. Empty rows are skipped.
+        """
+
+        rows = csv.reader(file)
+        if has_header:
+            next(rows, None)
+        return self.add_signups(row for row in rows if any(value.strip() for value in row))
+
+    def get_signups(self, start: int = 0) -> list[list]:
+        """
+        Returns the signups list.
+        Only the rows after the first start signups are read.
+        Rows are padded to the same width, as the rows read from google sheets.
+        """
+
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT row FROM signups WHERE spreadsheet_id = ? AND position >= ? ORDER BY position",
+                (self._spreadsheet_id, start)
+            ).fetchall()
+
+        signups = [json.loads(row) for row, in rows]
+        width = max((len(signup) for signup in signups), default=0)
+        return [signup + [""] * (width - len(signup)) for signup in signups]
+
+    def get_teams(self) -> list[list]:
+        """Returns the rows of the teams sheet. """
+
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT row FROM teams WHERE spreadsheet_id = ? ORDER BY position", (self._spreadsheet_id,)
+            ).fetchall()
+        return [json.loads(row) for row, in rows]
+
+    def get_bracket(self, status: str|None = None) -> list[dict]:
+        """Returns the matches of the bracket, only the ones with the status if it is given. """
+
+        query = f"SELECT number, {', '.join(self.BRACKET_COLUMNS)} FROM bracket WHERE spreadsheet_id = ?"
+        parameters = [self._spreadsheet_id]
+        if status is not None:
+            query += " AND status = ?"
+            parameters.append(status)
+
+        with self._lock:
+            rows = self._connection.execute(query + " ORDER BY number", parameters).fetchall()
+        return [self._row_to_match_info(row) for row in rows]
+
+    def update_teams_sheet(self, teams: list[list]):
+        """Writes the new and changed rows of the teams sheet and deletes the rows left from a longer one. """
+
+        rows = [json.dumps([str(value) for value in team]) for team in teams]
+
+        with self._lock, self._connection:
+            stored = dict(self._connection.execute(
+                "SELECT position, row FROM teams WHERE spreadsheet_id = ?", (self._spreadsheet_id,)
+            ))
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO teams (spreadsheet_id, position, row) VALUES (?, ?, ?)",
+                (
+                    (self._spreadsheet_id, position, row)
+                    for position, row in enumerate(rows) if stored.get(position) != row
+                )
+            )
+            self._connection.execute(
+                "DELETE FROM teams WHERE spreadsheet_id = ? AND position >= ?",
+                (self._spreadsheet_id, len(rows))
+            )
+
+        self._update_mirror("update_teams_sheet", teams)
+
+    def update_bracket_sheet(self, matches_info: list[dict], changed: list[int]|None = None):
+        """
+        Writes the changed matches of the bracket.
+        All the matches are compared with the stored ones if changed is None,
+        and the matches missing from the bracket are deleted.
+        """
+
+        if changed is None:
+            indexes = range(len(matches_info))
+        else:
+            indexes = [index for index in changed if index < len(matches_info)]
+        rows = [self._match_info_to_row(matches_info[index]) for index in indexes]
+
+        with self._lock, self._connection:
+            if changed is None:
+                stored = {
+                    row[0]: row
+                    for row in self._connection.execute(
+                        f"SELECT number, {', '.join(self.BRACKET_COLUMNS)} FROM bracket WHERE spreadsheet_id = ?",
+                        (self._spreadsheet_id,)
+                    )
+                }
+                numbers = {row[0] for row in rows}
+                rows = [row for row in rows if stored.get(row[0]) != row]
+                self._connection.executemany(
+                    "DELETE FROM bracket WHERE spreadsheet_id = ? AND number = ?",
+                    ((self._spreadsheet_id, number) for number in stored if number not in numbers)
+                )
+
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO bracket (spreadsheet_id, number, {', '.join(self.BRACKET_COLUMNS)}) "
+                f"VALUES (?, ?, {', '.join('?' * len(self.BRACKET_COLUMNS))})",
+                ((self._spreadsheet_id, *row) for row in rows)
+            )
+
+        # The mirror compares everything with its own copy, so it catches up after errors.
+        self._update_mirror("update_bracket_sheet", matches_info)
+
+    def _update_mirror(self, method: str, *args):
+        if self._mirror is None:
+            return
+        try:
+            getattr(self._mirror, method)(*args)
+        except Exception: # pylint: disable=broad-exception-caught
+            logger.exception("Failed to mirror %s of %s", method, self._spreadsheet_id)
+
+    @staticmethod
+    def _match_info_to_row(match_info: dict) -> tuple:
+        row = [match_info["number"], match_info["status"], match_info["score"]]
+        for team_key in ("team1", "team2"):
+            team = match_info[team_key]
+            if team is None:
+                row += [None, None, None]
+            else:
+                row += [team["name"], team["avatar_url"], team["country_emoji"]]
+        return tuple(row)
+
+    @staticmethod
+    def _row_to_match_info(row: tuple) -> dict:
+        match_info = {"number": row[0], "status": row[1], "score": row[2]}
+        for team_key, offset in (("team1", 3), ("team2", 6)):
+            name, avatar_url, country_emoji = row[offset:offset + 3]
+            match_info[team_key] = None if name is None and avatar_url is None else {
+                "name": name, "avatar_url": avatar_url, "country_emoji": country_emoji
+            }
+        return match_info
+
+def sheets_manager_from_config(config: dict) -> TournamentSheetsManager:
+    """Creates a sheets manager of any backend from its get_config() result. """
+    if config.get("backend") == SQLiteTournamentSheetsManager.BACKEND:
+        return SQLiteTournamentSheetsManager.from_config(config)
+    return OsuTournamentSheetsManager.from_config(config)
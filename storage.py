@@ -0,0 +1,253 @@
+""" Implementing of a local storage of tournament snapshots. """
+
+import json
+import sqlite3
+import sys
+import threading
+import time
+
+from tournament import (
+    Bracket,
+    BracketManager,
+    Game,
+    MatchManager,
+    RoundRobinBracketManager,
+    SEBracketManager,
+    SwissBracketManager,
+    Team,
+    TeamMember,
+    Tournament,
+    TournamentManager,
+)
+
+BRACKET_MANAGERS: dict[str, type[BracketManager]] = {
+    manager.FORMAT: manager
+    for manager in (SEBracketManager, SwissBracketManager, RoundRobinBracketManager)
+}
+
+class TournamentStore:
+    """
+    Represents a SQLite store of tournament snapshots.
+
+    Every saved snapshot replaces the previous one of the same tournament
+    in a single transaction, so the store always holds the last committed state.
+    The tournament selected in every guild is kept alongside the snapshots.
+    """
+
+    def __init__(self, path: str = "tournaments.db"):
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tournaments (
+                key TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS selections (
+                guild_id INTEGER PRIMARY KEY,
+                tournament_id TEXT NOT NULL
+            )
+            """
+        )
+        self._connection.commit()
+
+    def save(self, key: str, state: dict):
+        """Saves the snapshot of the tournament. """
+
+        data = json.dumps(state, ensure_ascii=False, separators=(",", ":"))
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO tournaments (key, state, updated_at) VALUES (?, ?, ?)",
+                (key, data, time.time())
+            )
+
+    def load(self, key: str) -> dict|None:
+        """Returns the last snapshot of the tournament or None if there is no one. """
+
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT state FROM tournaments WHERE key = ?", (key,)
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def delete(self, key: str):
+        """Deletes the snapshot of the tournament. """
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM tournaments WHERE key = ?", (key,))
+
+    def keys(self, prefix: str = "") -> list[str]:
+        """Returns the keys of the saved tournaments starting with the prefix. """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT key FROM tournaments WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def active_keys(self) -> list[str]:
+        """Returns the keys of the tournaments saved with matches being played. """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT key FROM tournaments WHERE json_extract(state, '$.active')"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def save_selection(self, guild_id: int, tournament_id: str):
+        """Saves the id of the tournament selected in the guild. """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO selections (guild_id, tournament_id) VALUES (?, ?)",
+                (guild_id, tournament_id)
+            )
+
+    def load_selection(self, guild_id: int) -> str|None:
+        """Returns the id of the tournament selected in the guild or None if there is no one. """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT tournament_id FROM selections WHERE guild_id = ?", (guild_id,)
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def close(self):
+        """Closes the database connection. """
+        with self._lock:
+            self._connection.close()
+
+SNAPSHOT_VERSION = 2
+
+class SnapshotVersionError(ValueError):
+    """Raised when a snapshot is saved in a format which can't be loaded. """
+
+def dump_tournament(tournament_manager: TournamentManager) -> dict:
+    """
+    Returns a json-serializable snapshot of the tournament and its bracket.
+    Teams are rows of (members, name, avatar_url, country_emoji) and matches are rows of
+    (stage, number, status, team1, team2, winner, score, match_id, next_match, games,
+    games_amount, last_event_id), which reference the values of the models instead of copying them.
+    Teams in matches are referenced by their index in the teams list
+    and matches by their number.
+    """
+
+    tournament = tournament_manager.get_tournament()
+    team_indexes = {team: index for index, team in enumerate(tournament.teams)}
+    team_indexes[None] = None
+
+    state = {
+        "version": SNAPSHOT_VERSION,
+        "team_length": tournament.team_length,
+        "signups_cursor": tournament.signups_cursor,
+        "teams": [
+            (
+                [
+                    (
+                        member.username,
+                        member.user_id,
+                        member.discord_id,
+                        member.avatar_url,
+                        member.country_emoji
+                    )
+                    for member in team.members
+                ],
+                team.name,
+                team.avatar_url,
+                team.country_emoji,
+            )
+            for team in tournament.teams
+        ],
+        "bracket": None,
+    }
+
+    bracket_manager = tournament_manager.get_bracket_manager()
+    if bracket_manager is None:
+        return state
+
+    bracket = bracket_manager.get_bracket()
+    state["bracket"] = {
+        "format": bracket_manager.FORMAT,
+        "teams": [team_indexes[team] for team in bracket.teams],
+        "loosers": [team_indexes[team] for team in bracket.loosers],
+        "matches": [
+            (
+                match.stage,
+                match.number,
+                match.status,
+                team_indexes[match.team1],
+                team_indexes[match.team2],
+                team_indexes[match.winner],
+                match.score,
+                match.match_id,
+                match.next_match.number if match.next_match is not None else None,
+                [(game.team1_score, game.team2_score, game.game_id) for game in match.games],
+                match.games_amount,
+                match.last_event_id,
+            )
+            for match in bracket.matches
+        ],
+    }
+    return state
+
+def load_tournament(state: dict, tournament_manager: TournamentManager, match_manager: MatchManager):
+    """
+    Restores the tournament and its bracket from the snapshot into the tournament manager.
+
+    Raises:
+        SnapshotVersionError: if the snapshot isn't of the current SNAPSHOT_VERSION.
+    """
+
+    if state.get("version") != SNAPSHOT_VERSION:
+        raise SnapshotVersionError(
+            f"snapshot version {state.get('version')} isn't supported, expected {SNAPSHOT_VERSION}"
+        )
+
+    tournament = Tournament(state["team_length"])
+    tournament.signups_cursor = state["signups_cursor"]
+    tournament.teams = [
+        Team([TeamMember(*member) for member in members], name, avatar_url, country_emoji)
+        for members, name, avatar_url, country_emoji in state["teams"]
+    ]
+
+    def get_team(index: int|None) -> Team|None:
+        return tournament.teams[index] if index is not None else None
+
+    bracket_manager = None
+    bracket_state = state["bracket"]
+
+    if bracket_state is not None:
+        bracket = Bracket()
+        bracket.teams = [get_team(index) for index in bracket_state["teams"]]
+        bracket.loosers = [get_team(index) for index in bracket_state["loosers"]]
+
+        next_matches = []
+        for (
+            stage, number, status, team1, team2, winner, score,
+            match_id, next_match_number, games, games_amount, last_event_id
+        ) in bracket_state["matches"]:
+            match = match_manager.create_match(
+                stage, number, sys.intern(status), get_team(team1), get_team(team2)
+            )
+            match.winner = get_team(winner)
+            match.score = sys.intern(score)
+            match.match_id = match_id
+            match.games = [Game(*game) for game in games]
+            match.game_ids = {game.game_id for game in match.games}
+            match.games_amount = games_amount
+            match.last_event_id = last_event_id
+
+            bracket.matches.append(match)
+            next_matches.append((match, next_match_number))
+
+        matches_by_number = {match.number: match for match in bracket.matches}
+        for match, next_match_number in next_matches:
+            if next_match_number is not None:
+                match.next_match = matches_by_number[next_match_number]
+
+        bracket_manager = BRACKET_MANAGERS[bracket_state["format"]](match_manager)
+        bracket_manager.restore_bracket(bracket)
+
+    tournament_manager.restore_tournament(tournament, bracket_manager)
@@ -1,14 +1,43 @@
 """Implemenattion of tournament. """
 
+import asyncio
+import logging
+import sys
 from abc import ABC, abstractmethod
+from concurrent.futures import Executor
 from dataclasses import dataclass, field
+from functools import partial
 from typing import Optional
+from events import (
+    EventBus, GameRecorded, MatchCompleted, MatchLinked, ScoreChanged, TeamAdvanced
+)
 from game_api_client import GameAPIClient
 from sheets_manager import TournamentSheetsManager
 
-@dataclass
+logger = logging.getLogger(__name__)
+
+class MatchUpdateError(Exception):
+    """
+    Raised when information about some of the updated matches can't be received,
+    the other matches are updated anyway.
+    """
+
+    def __init__(self, errors: dict[int, tuple[int, BaseException]]):
+        """errors are (game match id, error) by the number of the failed match. """
+        super().__init__(
+            ", ".join(
+                f"match #{number} (game match {match_id}): {error}"
+                for number, (match_id, error) in errors.items()
+            )
+        )
+        self.errors = errors
+
+@dataclass(slots=True)
 class TeamMember:
-    """Represents a member of the team. """
+    """
+    Represents a member of the team.
+    Avatar urls and country emojis are interned, as many players share them.
+    """
 
     username: str = field(compare=False)
     user_id: int
@@ -16,29 +45,42 @@ class TeamMember:
     avatar_url: str = field(compare=False)
     country_emoji: str = field(compare=False)
 
-@dataclass
+    def __post_init__(self):
+        self.avatar_url = sys.intern(self.avatar_url)
+        self.country_emoji = sys.intern(self.country_emoji)
+
+@dataclass(eq=False, slots=True)
 class Team:
-    """Represents a team of the tournament. """
+    """
+    Represents a team of the tournament.
+    Teams are compared and hashed by identity, so they can be used as index keys.
+    """
 
     members: list[TeamMember]
     name: str|None
     avatar_url: str|None
     country_emoji: str|None
 
+    def __post_init__(self):
+        if self.avatar_url is not None:
+            self.avatar_url = sys.intern(self.avatar_url)
+        if self.country_emoji is not None:
+            self.country_emoji = sys.intern(self.country_emoji)
+
     def __contains__(self, user_id: int|str) -> bool:
         for member in self.members:
             if (user_id in [member.user_id, member.discord_id]):
                 return True
         return False
 
-@dataclass
+@dataclass(slots=True)
 class Game:
     """Represents a game of the match. """
     team1_score: int = field(compare=False)
     team2_score: int = field(compare=False)
     game_id: int
 
-@dataclass
+@dataclass(slots=True)
 class Match:
     """Represents a match of the tournament bracket. """
 
@@ -57,6 +99,11 @@ class Match:
     games: list[Game] = field(init=False, default_factory=list)
     games_amount: int = field(init=False, default=3)
 
+    # Cursor and lookups for incremental processing of the match events.
+    last_event_id: int = field(init=False, default=0)
+    game_ids: set[int] = field(init=False, default_factory=set, repr=False)
+    player_sides: dict[int, int] = field(init=False, default_factory=dict, repr=False)
+
 class MatchManager(ABC):
     """Represents a class for managing the tournament match logic. """
 
@@ -92,28 +139,43 @@ class OsuMatchManager(MatchManager):
 
     @staticmethod
     def update_match(match: Match, match_info: dict):
-        """Updates match info. """
+        """
+        Updates match info with the events following the last processed one
+        and moves the match events cursor.
+        The cursor doesn't pass games which are still being played,
+        as their scores appear later.
+        """
+
+        if not match.player_sides:
+            for side, team in enumerate((match.team1, match.team2), 1):
+                for member in team.members:
+                    match.player_sides[member.user_id] = side
+
+        game_in_progress = False
 
         for event in match_info["events"]:
-            if ("game" not in event) or (not event["game"]["scores"]):
+            if not event.get("game"):
+                if not game_in_progress:
+                    match.last_event_id = max(match.last_event_id, event["id"])
                 continue
 
-            team1_score = 0
-            team2_score = 0
-            game_id = event["id"]
-
-            for score in event["game"]["scores"]:
-                if score["user_id"] in match.team1:
-                    team1_score += score["score"]
-                elif score["user_id"] in match.team2:
-                    team2_score += score["score"]
+            if not event["game"]["scores"]:
+                game_in_progress = True
+                continue
 
-            game = Game(team1_score, team2_score, game_id)
+            if not game_in_progress:
+                match.last_event_id = max(match.last_event_id, event["id"])
 
-            if game in match.games:
+            game_id = event["id"]
+            if game_id in match.game_ids:
                 continue
 
-            match.games.append(game)
+            team_scores = [0, 0, 0]
+            for score in event["game"]["scores"]:
+                team_scores[match.player_sides.get(score["user_id"], 0)] += score["score"]
+
+            match.games.append(Game(team_scores[1], team_scores[2], game_id))
+            match.game_ids.add(game_id)
 
             if match.games_amount == len(match.games):
                 break
@@ -129,7 +191,7 @@ class OsuMatchManager(MatchManager):
 
         match_score = f"{team1_match_score}:{team2_match_score}"
         if match.score != match_score:
-            match.score = match_score
+            match.score = sys.intern(match_score)
 
         if team1_match_score >= (match.games_amount // 2 + 1):
             match.winner = match.team1
@@ -142,15 +204,67 @@ class Bracket:
 
     matches: list[Match] = field(init=False, default_factory=list)
     loosers: list[Team] = field(init=False, default_factory=list)
+    teams: list[Team] = field(init=False, default_factory=list)
+
+    # Indexes for constant-time lookups of matches.
+    matches_by_number: dict[int, Match] = field(init=False, default_factory=dict, repr=False)
+    matches_by_match_id: dict[int, Match] = field(init=False, default_factory=dict, repr=False)
+
+@dataclass(eq=False, slots=True)
+class Standing:
+    """Represents a team's standing in a round based stage. """
+
+    team: Team
+    seed: int
+
+    points: int = 0
+    wins: int = 0
+    losses: int = 0
+    games_won: int = 0
+    games_lost: int = 0
+    buchholz: int = 0
+    had_bye: bool = False
+
+    opponents: list[Team] = field(default_factory=list, repr=False)
 
 class BracketManager(ABC):
-    """Represents a class for managing the tournament bracket logic. """
+    """
+    Represents a class for managing the tournament bracket logic.
+    Changes of the matches made after the bracket generation are published as events.
+    """
+
+    FORMAT: str
+    BYE_SCORE = "BYE"
+
+    # Whether the matches form an elimination tree which is drawn in the bracket sheet.
+    IS_TREE = True
 
     _bracket: Bracket|None
 
     def __init__(self, match_manager: MatchManager):
         self._bracket = None
         self._match_manager = match_manager
+        self._events = EventBus()
+
+    def get_event_bus(self) -> EventBus:
+        """Event bus getter. """
+        return self._events
+
+    def set_event_bus(self, events: EventBus):
+        """Makes the bracket publish its events to the bus. """
+        self._events = events
+
+    def get_bracket(self) -> Bracket|None:
+        """Bracket getter. """
+        return self._bracket
+
+    def restore_bracket(self, bracket: Bracket):
+        """Sets a previously saved bracket and rebuilds its indexes. """
+        self._bracket = bracket
+        bracket.matches_by_number = {match.number: match for match in bracket.matches}
+        bracket.matches_by_match_id = {
+            match.match_id: match for match in bracket.matches if match.match_id is not None
+        }
 
     @abstractmethod
     def generate_bracket(self, teams: list[Team]):
@@ -168,129 +282,487 @@ class BracketManager(ABC):
         """Bracket matches getter. """
         return self._bracket.matches
 
+    def get_match(self, match_number: int) -> Match|None:
+        """Returns the match by its number. """
+        return self._bracket.matches_by_number.get(match_number)
+
+    def connect_match_id(self, match_number: int, match_id: int):
+        """
+        Links the match with the game match id and starts it.
+        A match linked before, e.g. with a mistyped id, forgets the games of the previous one.
+        """
+        match = self._bracket.matches_by_number[match_number]
+
+        if match.match_id is not None:
+            self._bracket.matches_by_match_id.pop(match.match_id, None)
+            match.games = []
+            match.game_ids = set()
+            match.last_event_id = 0
+            self._set_score(match, "0:0")
+
+        match.match_id = match_id
+        match.status = "In Progress"
+        self._bracket.matches_by_match_id[match_id] = match
+        self._events.publish(MatchLinked(match, match_id))
+
+    def _add_match(self, match: Match):
+        """Appends a match to the bracket and its indexes. """
+        self._bracket.matches.append(match)
+        self._bracket.matches_by_number[match.number] = match
+        if match.match_id is not None:
+            self._bracket.matches_by_match_id[match.match_id] = match
+
+    def _update_match(self, match: Match, match_info: dict):
+        """Updates the match with the match manager and publishes its new games and score. """
+
+        games_amount = len(match.games)
+        previous_score = match.score
+        self._match_manager.update_match(match, match_info)
+
+        for game in match.games[games_amount:]:
+            self._events.publish(GameRecorded(match, game))
+        if match.score != previous_score:
+            self._events.publish(ScoreChanged(match, previous_score, match.score))
+
+    def _set_score(self, match: Match, score: str):
+        """Sets the score of the match entered directly. """
+
+        previous_score = match.score
+        match.score = score
+        if score != previous_score:
+            self._events.publish(ScoreChanged(match, previous_score, score))
+
+    def _complete_match(self, match: Match):
+        """Completes the match which has a winner. """
+        match.status = "Completed"
+        self._events.publish(MatchCompleted(match, match.winner))
+
 class SEBracketManager(BracketManager):
     """
     Represents a class for managing
     the tournament bracket logic in single elimination format.
     """
 
+    FORMAT = "single_elimination"
+
     def generate_bracket(self, teams: list[Team]):
         """
         Generates a bracket based on creating matches with balanced pairs of team,
         signifies the beginning of the main phase of the tournament, the match phase.
 
+        The bracket size is rounded up to a power of two and the missing
+        opponents of the top seeds are byes, so their first matches
+        are completed right away.
+
         Args:
-            teams (list[Team]): list of participating teams.
+            teams (list[Team]): list of participating teams ordered by seed.
 
         Raises:
-            ValueError: if bracket already exists.
+            ValueError: if there are less than two teams.
         """
 
-        self._bracket = Bracket()
-
-        # TODO: Add support for arbitrary length teams.
+        if len(teams) < 2:
+            raise ValueError("at least two teams are needed to generate a bracket")
 
-        pairs = [] # [{1:16}, {2:15}, {3:14}, ..., {i:N-i+1}]
-        # i: team_number (and match number); N: len(teams)
+        self._bracket = Bracket()
+        self._bracket.teams = list(teams)
 
-        for match_number in range(1, len(teams) // 2 + 1):
-            pair = {}
-            pair[match_number] = len(teams) - match_number + 1
-            pairs.append(pair)
+        bracket_size = 1 << (len(teams) - 1).bit_length()
+        seeds = self._get_seed_order(bracket_size)
 
-        balanced_pairs = self._balance_pairs(pairs)[0]
+        def get_team(seed: int) -> Team|None:
+            return teams[seed - 1] if seed <= len(teams) else None
 
         # Creating the initial matches
         match_number = 1
-        for team_number1, team_number2 in balanced_pairs.items():
-            team1 = teams[team_number1 - 1]
-            team2 = teams[team_number2 - 1]
+        for i in range(0, bracket_size, 2):
             match = self._match_manager.create_match(
-                len(teams) // 2, match_number, "Pending", team1, team2
+                bracket_size // 2, match_number, "Pending", get_team(seeds[i]), get_team(seeds[i + 1])
             )
-            self._bracket.matches.append(match)
+            self._add_match(match)
             match_number += 1
 
         # Creating the remaining matches
-        for i in range(0, len(teams) - 2, 2):
+        for i in range(0, bracket_size - 2, 2):
             match = self._match_manager.create_match(
                 self._bracket.matches[i].stage // 2, match_number, "Scheduled"
             )
 
-            self._bracket.matches.append(match)
+            self._add_match(match)
             self._bracket.matches[i].next_match = match
             self._bracket.matches[i + 1].next_match = match
 
             match_number += 1
 
+        # Moving the top seeds past their byes
+        for match in self._bracket.matches[:bracket_size // 2]:
+            if match.team2 is None:
+                match.winner = match.team1
+                match.status = "Completed"
+                match.score = self.BYE_SCORE
+                self._place_winner(match)
+
     def update_matches(self, matches_info: list[dict]):
         """Updates information about matches. """
 
         for match_info in matches_info:
-            for match in self._bracket.matches:
-                if match.match_id != match_info["match"]["id"]:
-                    continue
-                self._match_manager.update_match(match, match_info)
-                if match.winner is not None:
-                    match.status = "Completed"
+            match = self._bracket.matches_by_match_id.get(match_info["match"]["id"])
+            if match is None:
+                continue
 
-                if match.next_match is not None:
-                    if match.number % 2 != 0:
-                        match.next_match.team1 = match.winner
-                    else:
-                        match.next_match.team2 = match.winner
-
-                    match.next_match.status = "Pending"
-                break
+            self._update_match(match, match_info)
+            if match.winner is not None and match.status != "Completed":
+                self._complete_match(match)
+                self._advance_winner(match)
 
     def enter_match_results(self, match_number: int, winner_number: int, score: str):
-        """Enters the results of the match. """
+        """Enters the results of the match, completed matches and byes are left as they are. """
 
-        for match in self._bracket.matches:
-            if match.number == match_number:
-                if winner_number == 1:
-                    match.winner = match.team1
-                else:
-                    match.winner = match.team2
+        match = self._bracket.matches_by_number.get(match_number)
+        if match is None or match.status == "Completed" or match.team1 is None or match.team2 is None:
+            return
 
-                if match.next_match is not None:
-                    if match.number % 2 != 0:
-                        match.next_match.team1 = match.winner
-                    else:
-                        match.next_match.team2 = match.winner
-                    match.next_match.status = "Pending"
+        if winner_number == 1:
+            match.winner = match.team1
+        else:
+            match.winner = match.team2
 
-                match.status = "Completed"
-                match.score = score
-                break
+        self._set_score(match, score)
+        self._complete_match(match)
+        self._advance_winner(match)
+
+    def _advance_winner(self, match: Match):
+        """Moves the winner of the match to the next match. """
+
+        if match.next_match is None:
+            return
 
-    def _balance_pairs(self, pairs_of_matches: list[dict]) -> list[dict]:
+        self._place_winner(match)
+        self._events.publish(TeamAdvanced(match, match.winner, match.next_match))
+
+    def _place_winner(self, match: Match):
+        """Puts the winner of the match into its slot of the next match and opens it if it isn't started. """
+
+        if match.number % 2 != 0:
+            match.next_match.team1 = match.winner
+        else:
+            match.next_match.team2 = match.winner
+        if match.next_match.status == "Scheduled":
+            match.next_match.status = "Pending"
+
+    @staticmethod
+    def _get_seed_order(bracket_size: int) -> list[int]:
         """
-        Balances the initial pairs of matches so that strong teams (players)
-        don't meet in the early stages of the tournament bracket.
+        Returns the seeds in the order of the bracket slots, so that strong
+        teams (players) don't meet in the early stages of the tournament bracket.
+        Every pair of slots is a first round match.
 
         Example:
-        [                   [
-            {1: 16},           {1: 16,
-            {2: 15},            8: 9,
-            {3: 14},            4: 13,
-            {4: 13},            5: 12,
-                        --->
-            {5: 12},            2: 15,
-            {6: 11},            7: 10,
-            {7: 10},            3: 14,
-            {8: 9}              6: 11}
-        ]                   ]
+            8 ---> [1, 8, 4, 5, 2, 7, 3, 6]
         """
 
-        pairs = []
-        while pairs_of_matches:
-            merged_pairs = pairs_of_matches.pop(0) | pairs_of_matches.pop(-1)
-            pairs.append(merged_pairs)
+        seeds = [1]
+        while len(seeds) < bracket_size:
+            seeds_sum = len(seeds) * 2 + 1
+            seeds = [seed for top_seed in seeds for seed in (top_seed, seeds_sum - top_seed)]
+        return seeds
+
+class RoundBracketManager(BracketManager):
+    """
+    Represents a class for managing the tournament bracket logic in round based formats,
+    where every team plays a match each round and the standings are kept up to date
+    as the match results come in.
+    """
+
+    IS_TREE = False
+
+    def __init__(self, match_manager: MatchManager):
+        super().__init__(match_manager)
+        self._standings: dict[Team, Standing] = {}
+        self._recorded_matches: set[int] = set()
+        self._round = 0
+
+    def get_round(self) -> int:
+        """Returns the number of the current round. """
+        return self._round
+
+    def generate_bracket(self, teams: list[Team]):
+        """
+        Creates the standings and the matches of the first round.
+
+        Args:
+            teams (list[Team]): list of participating teams ordered by seed.
+
+        Raises:
+            ValueError: if there are less than two teams.
+        """
+
+        if len(teams) < 2:
+            raise ValueError("at least two teams are needed to generate a bracket")
+
+        self._bracket = Bracket()
+        self._bracket.teams = list(teams)
+        self._standings = {team: Standing(team, seed) for seed, team in enumerate(teams, 1)}
+        self._recorded_matches = set()
+        self._round = 0
+
+        self.generate_next_round()
+
+    def generate_next_round(self) -> list[Match]:
+        """
+        Creates the matches of the next round.
+
+        Raises:
+            ValueError: if the current round isn't completed or all the rounds are played.
+        """
+
+        if any(match.status != "Completed" for match in self._get_round_matches(self._round)):
+            raise ValueError("the current round isn't completed yet")
+
+        pairs = self._get_next_pairs()
+        if not pairs:
+            raise ValueError("all the rounds are played")
+
+        self._round += 1
+        match_number = len(self._bracket.matches) + 1
+        matches = []
+
+        for team1, team2 in pairs:
+            match = self._match_manager.create_match(self._round, match_number, "Pending", team1, team2)
+            self._add_match(match)
+            matches.append(match)
+            match_number += 1
+
+            if team2 is None:
+                match.winner = team1
+                match.status = "Completed"
+                match.score = self.BYE_SCORE
+                self._record_result(match)
+
+        return matches
+
+    def get_standings(self) -> list[Standing]:
+        """Returns the standings ordered by points, buchholz, games difference and seed. """
+
+        standings = list(self._standings.values())
+        for standing in standings:
+            standing.buchholz = sum(
+                self._standings[opponent].points for opponent in standing.opponents
+            )
+
+        return sorted(
+            standings,
+            key=lambda standing: (
+                -standing.points,
+                -standing.buchholz,
+                standing.games_lost - standing.games_won,
+                standing.seed
+            )
+        )
+
+    def update_matches(self, matches_info: list[dict]):
+        """Updates information about matches. """
+
+        for match_info in matches_info:
+            match = self._bracket.matches_by_match_id.get(match_info["match"]["id"])
+            if match is None:
+                continue
+
+            self._update_match(match, match_info)
+            if match.winner is not None and match.status != "Completed":
+                self._complete_match(match)
+                self._record_result(match)
+
+    def enter_match_results(self, match_number: int, winner_number: int, score: str):
+        """Enters the results of the match. """
+
+        match = self._bracket.matches_by_number.get(match_number)
+        if match is None or match.number in self._recorded_matches:
+            return
+
+        match.winner = match.team1 if winner_number == 1 else match.team2
+        self._set_score(match, score)
+        self._complete_match(match)
+        self._record_result(match)
+
+    def restore_bracket(self, bracket: Bracket):
+        """Sets a previously saved bracket and replays its results into the standings. """
+
+        super().restore_bracket(bracket)
+        self._standings = {
+            team: Standing(team, seed) for seed, team in enumerate(bracket.teams, 1)
+        }
+        self._recorded_matches = set()
+        self._round = max((match.stage for match in bracket.matches), default=0)
+
+        for match in bracket.matches:
+            if match.status == "Completed":
+                self._record_result(match)
+
+    @abstractmethod
+    def _get_next_pairs(self) -> list[tuple[Team, Team|None]]:
+        """Returns the pairs of the next round, a team paired with None gets a bye. """
+
+    def _get_round_matches(self, round_number: int) -> list[Match]:
+        """Returns the matches of the round, they are the last ones in the bracket. """
+
+        matches = []
+        for match in reversed(self._bracket.matches):
+            if match.stage != round_number:
+                break
+            matches.append(match)
+        return matches
+
+    def _record_result(self, match: Match):
+        """Adds the result of the completed match to the standings once. """
+
+        if match.number in self._recorded_matches or match.winner is None:
+            return
+        self._recorded_matches.add(match.number)
+
+        if match.team2 is None:
+            standing = self._standings[match.team1]
+            standing.points += 1
+            standing.wins += 1
+            standing.had_bye = True
+            return
+
+        standing1 = self._standings[match.team1]
+        standing2 = self._standings[match.team2]
+        standing1.opponents.append(match.team2)
+        standing2.opponents.append(match.team1)
+
+        games1, _, games2 = match.score.partition(":")
+        if games1.isdigit() and games2.isdigit():
+            standing1.games_won += int(games1)
+            standing1.games_lost += int(games2)
+            standing2.games_won += int(games2)
+            standing2.games_lost += int(games1)
+
+        winner, loser = (standing1, standing2) if match.winner is match.team1 else (standing2, standing1)
+        winner.points += 1
+        winner.wins += 1
+        loser.losses += 1
+
+class SwissBracketManager(RoundBracketManager):
+    """
+    Represents a class for managing the tournament bracket logic in swiss format.
+
+    Every round the teams are split into groups by points, the top half
+    of a group is paired with the bottom half avoiding rematches,
+    and the teams which can't be paired float down to the next group.
+    """
+
+    FORMAT = "swiss"
+
+    def __init__(self, match_manager: MatchManager, rounds_amount: int|None = None):
+        super().__init__(match_manager)
+        self._rounds_amount = rounds_amount
+
+    def _get_next_pairs(self) -> list[tuple[Team, Team|None]]:
+        rounds_amount = self._rounds_amount
+        if rounds_amount is None:
+            rounds_amount = (len(self._standings) - 1).bit_length()
+        if self._round >= rounds_amount:
+            return []
+
+        ranked = sorted(self._standings.values(), key=lambda standing: (-standing.points, standing.seed))
+        pairs: list[tuple[Team, Team|None]] = []
+
+        if len(ranked) % 2 != 0:
+            bye = next(
+                (standing for standing in reversed(ranked) if not standing.had_bye),
+                ranked[-1]
+            )
+            ranked.remove(bye)
+            pairs.append((bye.team, None))
 
-        if len(pairs) == 1:
-            return pairs
-        return self._balance_pairs(pairs)
+        groups: dict[int, list[Standing]] = {}
+        for standing in ranked:
+            groups.setdefault(standing.points, []).append(standing)
+
+        played_pairs = []
+        floaters: list[Standing] = []
+
+        for points in sorted(groups, reverse=True):
+            group = floaters + groups[points]
+            top, bottom = group[:len(group) // 2], group[len(group) // 2:]
+            floaters = []
+
+            for standing in top:
+                opponent = next(
+                    (other for other in bottom if other.team not in standing.opponents), None
+                )
+                if opponent is None:
+                    floaters.append(standing)
+                    continue
+                bottom.remove(opponent)
+                played_pairs.append((standing, opponent))
+
+            floaters.extend(bottom)
+
+        # The last floaters are paired with each other, rematches are allowed only as a last resort.
+        while floaters:
+            standing = floaters.pop(0)
+            index = next(
+                (i for i, other in enumerate(floaters) if other.team not in standing.opponents), 0
+            )
+            played_pairs.append((standing, floaters.pop(index)))
+
+        self._resolve_rematches(played_pairs)
+
+        pairs[:0] = [(standing1.team, standing2.team) for standing1, standing2 in played_pairs]
+        return pairs
+
+    @staticmethod
+    def _resolve_rematches(pairs: list[tuple[Standing, Standing]]):
+        """Swaps the opponents of rematch pairs with the closest pairs where it removes the rematch. """
+
+        def is_new(standing1: Standing, standing2: Standing) -> bool:
+            return standing2.team not in standing1.opponents
+
+        for i in range(len(pairs) - 1, -1, -1):
+            standing1, standing2 = pairs[i]
+            if is_new(standing1, standing2):
+                continue
+
+            for j in range(i - 1, -1, -1):
+                standing3, standing4 = pairs[j]
+                if is_new(standing1, standing4) and is_new(standing3, standing2):
+                    pairs[i], pairs[j] = (standing1, standing4), (standing3, standing2)
+                    break
+                if is_new(standing1, standing3) and is_new(standing4, standing2):
+                    pairs[i], pairs[j] = (standing1, standing3), (standing4, standing2)
+                    break
+
+class RoundRobinBracketManager(RoundBracketManager):
+    """
+    Represents a class for managing the tournament bracket logic in round robin format.
+    The pairs of every round are computed directly by the circle method.
+    """
+
+    FORMAT = "round_robin"
+
+    def _get_next_pairs(self) -> list[tuple[Team, Team|None]]:
+        teams: list[Team|None] = list(self._bracket.teams)
+        if len(teams) % 2 != 0:
+            teams.append(None)
+
+        if self._round >= len(teams) - 1:
+            return []
+
+        # The first team is fixed and the others are rotated by the round number.
+        rest = teams[1:]
+        shift = self._round % len(rest)
+        circle = [teams[0]] + rest[-shift:] + rest[:-shift] if shift else teams
+
+        pairs = []
+        for i in range(len(circle) // 2):
+            team1, team2 = circle[i], circle[-1 - i]
+            if team1 is None:
+                team1, team2 = team2, team1
+            pairs.append((team1, team2))
+        return pairs
 
 @dataclass
 class Tournament:
@@ -299,9 +771,18 @@ class Tournament:
     team_length: int
 
     teams: list[Team] = field(init=False, default_factory=list)
+    signups_cursor: int = field(init=False, default=0)
+
+    # Indexes for constant-time lookups of players and their current matches.
+    teams_by_user_id: dict[int, Team] = field(init=False, default_factory=dict, repr=False)
+    teams_by_discord_id: dict[str, Team] = field(init=False, default_factory=dict, repr=False)
+    team_matches: dict[Team, Match] = field(init=False, default_factory=dict, repr=False)
 
 class TournamentManager(ABC):
-    """Represents a class for managing the tournament logic. """
+    """
+    Represents a class for managing the tournament logic.
+    The events of its bracket are published to the event bus of the manager.
+    """
 
     _tournament: Tournament|None
     _bracket_manager: BracketManager|None
@@ -311,6 +792,13 @@ class TournamentManager(ABC):
         self._bracket_manager = None
         self._tournament = None
 
+        self._events = EventBus()
+        self._events.subscribe(TeamAdvanced, self._on_team_advanced)
+
+    def get_event_bus(self) -> EventBus:
+        """Event bus getter. """
+        return self._events
+
     def get_teams(self):
         """Tournament teams getter. """
         return self._tournament.teams
@@ -319,13 +807,40 @@ class TournamentManager(ABC):
         """bracket matches getter. """
         return self._bracket_manager.get_matches()
 
+    def get_tournament(self) -> Tournament|None:
+        """Tournament getter. """
+        return self._tournament
+
+    def get_bracket_manager(self) -> BracketManager|None:
+        """Bracket manager getter. """
+        return self._bracket_manager
+
+    def restore_tournament(self, tournament: Tournament, bracket_manager: BracketManager|None = None):
+        """Sets a previously saved tournament and bracket and rebuilds their indexes. """
+
+        teams = tournament.teams
+        tournament.teams = []
+        self._tournament = tournament
+        for team in teams:
+            self._append_team(team)
+
+        self._bracket_manager = bracket_manager
+        if bracket_manager is not None:
+            bracket_manager.set_event_bus(self._events)
+            for match in bracket_manager.get_matches():
+                self._index_match(match)
+
+    def get_signups_cursor(self) -> int:
+        """Returns the amount of signups that have been already processed. """
+        return self._tournament.signups_cursor
+
     @abstractmethod
     def create_tournament(self, team_length: int):
         """Creates an instance of Tournament, which marks the start of registration stage. """
 
     @abstractmethod
-    def update_teams(self, signups: list[list]) -> bool:
-        """Updates teams list based on the signups info. """
+    async def update_teams(self, signups: list[list]) -> bool:
+        """Updates teams list based on the new signups following the signups cursor. """
 
     @abstractmethod
     def generate_bracket(self, bracket_manager: BracketManager):
@@ -336,8 +851,58 @@ class TournamentManager(ABC):
         """Enters directly the results of the match. """
 
     @abstractmethod
-    def update_bracket(self) -> bool:
-        """Updates information aboout bracket matches. """
+    async def update_bracket(self, matches: list[Match]|None = None) -> bool:
+        """Updates information aboout bracket matches, all the linked ones by default. """
+
+    @abstractmethod
+    def connect_match_id(self, match_id: int, discord_id: str) -> bool:
+        """Connects a match id to the current match of the player's team. """
+
+    def generate_next_round(self) -> list[Match]:
+        """
+        Creates the matches of the next round of a round based bracket.
+
+        Raises:
+            ValueError: if the bracket isn't round based or the next round can't be created.
+        """
+
+        if not isinstance(self._bracket_manager, RoundBracketManager):
+            raise ValueError("the bracket has no rounds")
+
+        matches = self._bracket_manager.generate_next_round()
+        for match in matches:
+            self._index_match(match)
+        return matches
+
+    def get_standings(self) -> list[Standing]:
+        """
+        Returns the standings of a round based bracket.
+
+        Raises:
+            ValueError: if the bracket isn't round based.
+        """
+
+        if not isinstance(self._bracket_manager, RoundBracketManager):
+            raise ValueError("the bracket has no standings")
+        return self._bracket_manager.get_standings()
+
+    def _append_team(self, team: Team):
+        """Append a team to the teams list and the players indexes. """
+        self._tournament.teams.append(team)
+
+        for member in team.members:
+            self._tournament.teams_by_user_id[member.user_id] = team
+            self._tournament.teams_by_discord_id[member.discord_id] = team
+
+    def _index_match(self, match: Match):
+        """Makes the match current for its teams. """
+        for team in (match.team1, match.team2):
+            if team is not None:
+                self._tournament.team_matches[team] = match
+
+    def _on_team_advanced(self, event: TeamAdvanced):
+        """Makes the next match current for the advanced team. """
+        self._tournament.team_matches[event.team] = event.next_match
 
 class OsuTournamentManager(TournamentManager):
     """Represents a manager for managing the logic of an osu! tournament. """
@@ -352,18 +917,42 @@ class OsuTournamentManager(TournamentManager):
         """
         self._tournament = Tournament(team_length)
 
-    def update_teams(self, signups: list[list]) -> bool:
-        """Updates the teams list when there are new signups. """
+    async def update_teams(self, signups: list[list]) -> bool:
+        """
+        Updates the teams list when there are new signups
+        and moves the signups cursor past them.
+        Information about all the signed up users is requested in batches,
+        the malformed signups and the signups of users who are not found
+        or already signed up are skipped and logged with their row.
+        """
 
         updated = False
 
-        for signup in signups:
+        parsed_signups = [self._parse_signup(signup) for signup in signups]
+        osu_ids = {
+            osu_id
+            for members in parsed_signups if members is not None
+            for osu_id, _ in members
+        }
+        users_data = await self._game_api_client.get_users_info(list(osu_ids))
+
+        # The first row of the signups sheet is a header.
+        first_row = self._tournament.signups_cursor + 2
+        for row, (signup, members) in enumerate(zip(signups, parsed_signups), first_row):
+            if members is None:
+                logger.warning("Signup in row %s is malformed: %s", row, signup)
+                continue
+
             team_members = []
-            for i in range(1, self._tournament.team_length * 2, 2):
-                osu_id = int(signup[i])
-                discord_id = signup[i + 1]
+            for osu_id, discord_id in members:
+                if osu_id in self._tournament.teams_by_user_id or\
+                    discord_id in self._tournament.teams_by_discord_id or\
+                    any(osu_id == member.user_id for member in team_members) or\
+                    osu_id not in users_data:
+
+                    break
 
-                user_data = self._game_api_client.get_user_info(osu_id)
+                user_data = users_data[osu_id]
 
                 username = user_data["username"]
                 avatar_url = user_data["avatar_url"]
@@ -377,16 +966,13 @@ class OsuTournamentManager(TournamentManager):
                         country_emoji
                     )
 
-                if team_member in self._tournament.teams:
-                    break
-
                 team_members.append(team_member)
 
             if len(team_members) != self._tournament.team_length:
-                if team_members:
-                    # TODO: Need to get the word somehow to host of the tournament
-                    # that one of signups is bad.
-                    pass
+                logger.warning(
+                    "Signup in row %s is skipped, one of its players is already signed up or not found: %s",
+                    row, signup
+                )
                 continue
 
             updated = True
@@ -399,96 +985,250 @@ class OsuTournamentManager(TournamentManager):
                     team_member.country_emoji
                 )
             )
+
+        self._tournament.signups_cursor += len(signups)
         return updated
 
     def generate_bracket(self, bracket_manager: BracketManager):
         """Creates a bracket, signifies the beginning of the playing phase.. """
         self._bracket_manager = bracket_manager
+        self._bracket_manager.set_event_bus(self._events)
         self._bracket_manager.generate_bracket(self._tournament.teams)
 
-    def update_bracket(self) -> bool:
-        """Updates information aboout bracket matches. """
+        for match in self._bracket_manager.get_matches():
+            self._index_match(match)
 
-        matches_info = []
+    async def update_bracket(self, matches: list[Match]|None = None) -> bool:
+        """
+        Updates information aboout bracket matches.
+        Information about all the matches in progress is requested concurrently.
 
-        for match in self._bracket_manager.get_matches():
-            if match.status in ["Completed", "Scheduled"] or\
-                match.status == "Pending" and match.match_id is None:
+        Args:
+            matches (list[Match]|None): matches to update,
+                all the matches in progress if None.
 
-                continue
+        Raises:
+            MatchUpdateError: if information about some matches can't be received,
+                the other matches are updated before it is raised.
+        """
+
+        if matches is None:
+            matches = []
+
+            for match in self._bracket_manager.get_matches():
+                if match.status in ["Completed", "Scheduled"] or\
+                    match.status == "Pending" and match.match_id is None:
+
+                    continue
 
-            match_info = self._game_api_client.get_match_info(match.match_id)
-            matches_info.append(match_info)
+                matches.append(match)
+
+        results = await asyncio.gather(
+            *(
+                self._game_api_client.get_match_info(match.match_id, match.last_event_id)
+                for match in matches
+            ),
+            return_exceptions=True
+        )
+
+        matches_info = []
+        errors = {}
+        for match, result in zip(matches, results):
+            if isinstance(result, Exception):
+                errors[match.number] = (match.match_id, result)
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                matches_info.append(result)
 
         if matches_info:
             self._bracket_manager.update_matches(matches_info)
-            return True
-        return False
+        if errors:
+            raise MatchUpdateError(errors)
+        return bool(matches_info)
 
     def enter_match_results(self, match_number: int, winner_number: int, score: str):
         """Enters directly results of the match. """
         self._bracket_manager.enter_match_results(match_number, winner_number, score)
 
-    def _append_team(self, team: Team):
-        """Append a team to the teams list. """
-        self._tournament.teams.append(team)
+    def connect_match_id(self, match_id: int, discord_id: str) -> bool:
+        """
+        Connects a match id to the current match of the player's team.
+        The id of a match which isn't completed yet can be replaced, e.g. if it is mistyped.
+
+        Returns:
+            bool: whether the match has been found and connected.
+        """
+
+        team = self._tournament.teams_by_discord_id.get(discord_id)
+        match = self._tournament.team_matches.get(team)
+
+        if match is None or match.team1 is None or match.team2 is None:
+            return False
+
+        if match.match_id == match_id or match.status == "Completed":
+            return False
+
+        self._bracket_manager.connect_match_id(match.number, match_id)
+        return True
+
+    def _parse_signup(self, signup: list[str]) -> list[tuple[int, str]]|None:
+        """
+        Returns (osu_id, discord_id) of every member of the signup
+        or None if the signup is malformed.
+        """
+
+        members = []
+        for i in range(1, self._tournament.team_length * 2, 2):
+            if len(signup) <= i + 1 or not signup[i].strip().isdigit():
+                return None
+            members.append((int(signup[i]), signup[i + 1]))
+        return members
 
     def _get_country_emoji(self, country_code: str) -> str:
-        return "".join(chr(127397 + ord(c)) for c in country_code)
+        return sys.intern("".join(chr(127397 + ord(c)) for c in country_code))
 
 
 class TournamentService:
     """
     Represents a service for interacting between
     tournament data and sheets manager.
+
+    Blocking calls of the sheets manager are run on the executor,
+    the default executor of the event loop is used if it isn't given.
+
+    The bracket sheet payload is kept between the updates, only the matches
+    changed according to the bracket events are converted and compared again.
     """
 
     def __init__(
         self,
         sheets_manager: TournamentSheetsManager,
-        tournament_manager: TournamentManager
+        tournament_manager: TournamentManager,
+        executor: Executor|None = None
     ):
         self._sheets_manager = sheets_manager
         self._tournament_manager = tournament_manager
+        self._executor = executor
+
+        # Sheet payloads of the teams, which don't change after the registration.
+        self._team_infos: dict[Team, dict] = {}
+
+        # Bracket sheet payload of the matches of the synced bracket
+        # and the numbers of the matches changed since the last update.
+        self._matches_info: list[dict]|None = None
+        self._synced_bracket: Bracket|None = None
+        self._match_indexes: dict[int, int] = {}
+        self._changed_matches: set[int] = set()
+
+        events = tournament_manager.get_event_bus()
+        for event_type in (MatchLinked, ScoreChanged, MatchCompleted):
+            events.subscribe(event_type, self._on_match_changed)
+        events.subscribe(TeamAdvanced, self._on_team_advanced)
 
     def create_tournament(self, team_length: int = 1):
         """Creates a tournament, signifies the beginning of the registration phase. """
         self._tournament_manager.create_tournament(team_length)
+        self._team_infos.clear()
 
-    def update_teams(self):
-        """Updates the teams list and teams_sheet. """
-        signups = self._sheets_manager.get_signups()
-        updated = self._tournament_manager.update_teams(signups)
+    async def update_teams(self):
+        """
+        Updates the teams list and teams_sheet.
+        Only the signups after the already processed ones are read.
+        """
+        signups = await self._run_blocking(
+            self._sheets_manager.get_signups, self._tournament_manager.get_signups_cursor()
+        )
+        updated = await self._tournament_manager.update_teams(signups)
 
         if updated:
             teams_info = self._convert_teams_for_updating()
-            self._sheets_manager.update_teams_sheet(teams_info)
+            await self._run_blocking(self._sheets_manager.update_teams_sheet, teams_info)
 
     def generate_bracket(self, bracket_manager: BracketManager):
         """Creates a tournament bracket, signifies the beginning of the playing phase. """
         self._tournament_manager.generate_bracket(bracket_manager)
 
-    def update_bracket(self):
-        """Updates the tournament bracket and bracket_sheet. """
-        self._tournament_manager.update_bracket()
+    def get_matches(self) -> list[Match]:
+        """Returns the tournament bracket matches. """
+        return self._tournament_manager.get_matches()
 
-        matches_info = self._convert_matches_for_updating()
-        self._sheets_manager.update_bracket_sheet(matches_info)
+    def get_tournament_manager(self) -> TournamentManager:
+        """Tournament manager getter. """
+        return self._tournament_manager
 
-    def connect_match_id(self, match_id: int, discord_id: str):
-        """Connects a match id to the corresponding match. """
-        matches = self._tournament_manager.get_matches()
+    def get_sheets_manager(self) -> TournamentSheetsManager:
+        """Sheets manager getter. """
+        return self._sheets_manager
 
-        for match in matches:
-            if match.team1 is None or match.team2 is None:
-                continue
+    async def update_bracket(self):
+        """
+        Updates the tournament bracket and bracket_sheet.
 
-            if match.match_id is not None:
-                continue
+        Raises:
+            MatchUpdateError: if some matches can't be updated,
+                the others are updated and written to bracket_sheet anyway.
+        """
+        error = None
+        try:
+            await self._tournament_manager.update_bracket()
+        except MatchUpdateError as e:
+            error = e
+
+        await self.update_bracket_sheet()
+        if error is not None:
+            raise error
+
+    async def update_matches(self, matches: list[Match]) -> bool:
+        """Updates the given matches without updating bracket_sheet. """
+        return await self._tournament_manager.update_bracket(matches)
 
-            if discord_id in match.team1 or discord_id in match.team2:
-                match.match_id = match_id
-                match.status = "In Progress"
+    def generate_next_round(self) -> list[Match]:
+        """Creates the matches of the next round of a round based bracket. """
+        return self._tournament_manager.generate_next_round()
+
+    def get_standings(self) -> list[Standing]:
+        """Returns the standings of a round based bracket. """
+        return self._tournament_manager.get_standings()
+
+    async def update_bracket_sheet(self):
+        """
+        Updates bracket_sheet with the current state of the bracket.
+        Round based brackets have no tree to draw, so they are not written.
+        """
+        bracket_manager = self._tournament_manager.get_bracket_manager()
+        if not bracket_manager.IS_TREE:
+            return
+
+        matches = bracket_manager.get_matches()
+        changed = None
+
+        if self._synced_bracket is not bracket_manager.get_bracket() or\
+            len(self._matches_info) != len(matches):
+
+            self._matches_info = self._convert_matches_for_updating()
+            self._synced_bracket = bracket_manager.get_bracket()
+            self._match_indexes = {match.number: index for index, match in enumerate(matches)}
+        else:
+            changed = sorted(self._match_indexes[number] for number in self._changed_matches)
+            for index in changed:
+                self._matches_info[index] = self._convert_match(matches[index])
+        self._changed_matches.clear()
+
+        try:
+            await self._run_blocking(
+                self._sheets_manager.update_bracket_sheet, list(self._matches_info), changed
+            )
+        except Exception:
+            # The changes are compared again on the next update.
+            self._changed_matches.update(matches[index].number for index in changed or ())
+            if changed is None:
+                self._synced_bracket = None
+            raise
+
+    def connect_match_id(self, match_id: int, discord_id: str) -> bool:
+        """Connects a match id to the corresponding match. """
+        return self._tournament_manager.connect_match_id(match_id, discord_id)
 
     def enter_match_results(self, match_number: int, winner_number: int, score: str):
         """Enters directly the results of the match. """
@@ -501,24 +1241,59 @@ class TournamentService:
         if len(score) != 3:
             raise ValueError("wrong score format")
 
-        self._tournament_manager.enter_match_results(match_number, winner_number, score)
+        match = self._tournament_manager.get_bracket_manager().get_match(match_number)
+        if match is None:
+            raise ValueError("wrong match number")
 
-    def _convert_matches_for_updating(self) -> list[dict]:
-        matches_info = []
-        matches = self._tournament_manager.get_matches()
+        if match.status == "Completed":
+            raise ValueError("the match is already completed")
 
-        for match in matches:
-            match_info = match.__dict__.copy()
+        if match.team1 is None or match.team2 is None:
+            raise ValueError("the match doesn't have both teams")
+
+        self._tournament_manager.enter_match_results(match_number, winner_number, score)
 
-            if match_info["team1"] is not None:
-                match_info["team1"] = match.team1.__dict__
+    async def _run_blocking(self, func, *args):
+        """Runs a blocking function on the executor. """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args))
 
-            if match_info["team2"] is not None:
-                match_info["team2"] = match.team2.__dict__
+    def _on_match_changed(self, event: MatchLinked|ScoreChanged|MatchCompleted):
+        self._changed_matches.add(event.match.number)
 
-            matches_info.append(match_info)
+    def _on_team_advanced(self, event: TeamAdvanced):
+        self._changed_matches.add(event.next_match.number)
 
-        return matches_info
+    def _convert_matches_for_updating(self) -> list[dict]:
+        """
+        Returns the bracket sheet payload of the matches.
+        The payload references the values of the matches without copying them
+        and the payload of every team is built once.
+        """
+        return [self._convert_match(match) for match in self._tournament_manager.get_matches()]
+
+    def _convert_match(self, match: Match) -> dict:
+        return {
+            "number": match.number,
+            "status": match.status,
+            "score": match.score,
+            "team1": self._convert_team(match.team1),
+            "team2": self._convert_team(match.team2),
+        }
+
+    def _convert_team(self, team: Team|None) -> dict|None:
+        if team is None:
+            return None
+
+        team_info = self._team_infos.get(team)
+        if team_info is None:
+            team_info = {
+                "name": team.name,
+                "avatar_url": team.avatar_url,
+                "country_emoji": team.country_emoji,
+            }
+            self._team_infos[team] = team_info
+        return team_info
 
     # TODO: Change list[list] to list[dict].
     def _convert_teams_for_updating(self) -> list[list]:
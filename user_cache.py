@@ -0,0 +1,209 @@
+""" Implementing of a persistent cache of game user profiles. """
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor
+
+from game_api_client import GameAPIClient
+
+logger = logging.getLogger(__name__)
+
+class UserProfileCache:
+    """
+    Represents a cache of user profiles with TTL and LRU eviction,
+    which is persisted to a local json file.
+    """
+
+    PROFILE_KEYS = ("username", "avatar_url", "country_code")
+
+    def __init__(self, path: str|None = None, ttl: float = 86400, max_size: int = 5000):
+        self._path = path
+        self._ttl = ttl
+        self._max_size = max_size
+        self._profiles: OrderedDict[int, tuple[float, dict]] = OrderedDict()
+        self._dirty = False
+
+        self.hits = 0
+        self.misses = 0
+
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+    @property
+    def stats(self) -> dict:
+        """Returns hit/miss counters of the cache. """
+        requests = self.hits + self.misses
+        return {
+            "size": len(self._profiles),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else 0.0,
+        }
+
+    def get(self, user_id: int) -> dict|None:
+        """Returns a cached profile or None if it is missing or expired. """
+
+        entry = self._profiles.get(user_id)
+        if entry is None or time.time() - entry[0] > self._ttl:
+            if entry is not None:
+                del self._profiles[user_id]
+                self._dirty = True
+            self.misses += 1
+            return None
+
+        self._profiles.move_to_end(user_id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, user_id: int, user_data: dict):
+        """Stores a profile, evicting the least recently used ones when the cache is full. """
+
+        profile = {key: user_data[key] for key in self.PROFILE_KEYS}
+        self._profiles[user_id] = (time.time(), profile)
+        self._profiles.move_to_end(user_id)
+
+        while len(self._profiles) > self._max_size:
+            self._profiles.popitem(last=False)
+
+        self._dirty = True
+
+    def load(self):
+        """
+        Loads the cache from the file, skipping the expired profiles.
+        The cache starts empty if the file can't be read or is corrupt.
+        """
+
+        try:
+            with open(self._path, encoding="utf-8") as file:
+                entries = json.load(file)
+
+            now = time.time()
+            for user_id, stored_at, profile in entries:
+                if now - stored_at <= self._ttl:
+                    self._profiles[int(user_id)] = (stored_at, profile)
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning("Failed to load the user cache from %s, starting empty: %s", self._path, e)
+            self._profiles.clear()
+            return
+
+        while len(self._profiles) > self._max_size:
+            self._profiles.popitem(last=False)
+
+    def save(self):
+        """Saves the cache to the file if it has changed. """
+
+        entries = self.dump()
+        if entries is not None:
+            self.write(entries)
+
+    def dump(self) -> list|None:
+        """
+        Returns the entries to be saved and marks the cache as saved,
+        or None if it hasn't changed. The profiles aren't copied, as they are never changed in place.
+        """
+
+        if self._path is None or not self._dirty:
+            return None
+
+        self._dirty = False
+        return [
+            [user_id, stored_at, profile]
+            for user_id, (stored_at, profile) in self._profiles.items()
+        ]
+
+    def write(self, entries: list):
+        """Writes the dumped entries to the file, replacing it at once. """
+
+        temp_path = f"{self._path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(entries, file, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temp_path, self._path)
+
+class CachedGameAPIClient(GameAPIClient):
+    """
+    Represents a game api client which serves user profiles from the cache
+    and requests only missing ones from the wrapped client.
+    The cache file is written on the executor, the default one of the event loop if it isn't given.
+    """
+
+    def __init__(
+        self,
+        game_api_client: GameAPIClient,
+        cache: UserProfileCache,
+        save_delay: float = 1.0,
+        executor: Executor|None = None
+    ):
+        self._game_api_client = game_api_client
+        self._cache = cache
+        self._save_delay = save_delay
+        self._executor = executor
+        self._save_task: asyncio.Task|None = None
+
+    @property
+    def cache(self) -> UserProfileCache:
+        """User profile cache getter. """
+        return self._cache
+
+    async def get_user_info(self, user_id: int) -> dict:
+        """Returns user info from the cache, requesting it on a miss. """
+
+        user_data = self._cache.get(user_id)
+        if user_data is not None:
+            return user_data
+
+        user_data = await self._game_api_client.get_user_info(user_id)
+        self._cache.put(user_id, user_data)
+        self._schedule_save()
+        return user_data
+
+    async def get_users_info(self, user_ids: list[int]) -> dict[int, dict]:
+        """Returns users info from the cache, requesting all the missing ones in batches. """
+
+        users_data = {}
+        missing_ids = []
+        for user_id in dict.fromkeys(user_ids):
+            user_data = self._cache.get(user_id)
+            if user_data is None:
+                missing_ids.append(user_id)
+                continue
+            users_data[user_id] = user_data
+
+        if missing_ids:
+            requested = await self._game_api_client.get_users_info(missing_ids)
+            for user_id, user_data in requested.items():
+                self._cache.put(user_id, user_data)
+            users_data.update(requested)
+            self._schedule_save()
+
+        return users_data
+
+    async def get_match_info(self, match_id: int, after: int|None = None) -> dict:
+        """Match info is always requested from the wrapped client. """
+        return await self._game_api_client.get_match_info(match_id, after)
+
+    def _schedule_save(self):
+        """Saves the cache a bit later, so that a burst of misses leads to a single write. """
+
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self._save_later())
+
+    async def _save_later(self):
+        await asyncio.sleep(self._save_delay)
+        # The misses from now on schedule another save.
+        self._save_task = None
+
+        entries = self._cache.dump()
+        if entries is None:
+            return
+
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._cache.write, entries)
+        except OSError:
+            logger.exception("Failed to save the user cache")